@@ -0,0 +1,86 @@
+"""Compares the per-row chart data preparation with the vectorised one on a year of per-minute samples.
+
+Run it from the src folder: python -m benchmarks.chart_data
+"""
+from __future__ import annotations
+
+import numpy as np
+import pytz
+import time
+
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+from helpers.chart import daily_peaks, time_points
+
+SAMPLES = 365 * 24 * 60
+START = 1_704_067_200 # 2024-01-01 UTC
+TIMEZONE = pytz.timezone("Europe/Berlin")
+RUNS = 3
+
+class RowChartData:
+    """What a day used to be: a dict of its time points and their peak."""
+    def __init__(self) -> None:
+        self.max_playercount: int = 0
+        self.samples: int = 0
+        self.time_data: Dict[str, int] = {}
+
+def chart_data_from_res(res: List[Tuple[int, str, str]]) -> Dict[str, RowChartData]:
+    # The loop Chart.chart_data_from_res ran over the (playercount, date, time) rows
+    filtered: Dict[str, RowChartData] = {}
+
+    current_date = ""
+    for i, data in enumerate(res):
+        if not current_date:
+            current_date = data[1]
+            chart_data = RowChartData()
+
+        if data[1] == current_date:
+            chart_data.time_data[data[2]] = data[0]
+        else:
+            chart_data.max_playercount = max([i for i in chart_data.time_data.values()])
+            chart_data.samples = len(chart_data.time_data)
+            filtered[current_date] = chart_data
+
+            current_date = data[1]
+            chart_data = RowChartData()
+            chart_data.time_data[data[2]] = data[0]
+
+        if (len(res) - 1) == i:
+            chart_data.max_playercount = max([i for i in chart_data.time_data.values()])
+            chart_data.samples = len(chart_data.time_data)
+            filtered[current_date] = chart_data
+
+    return filtered
+
+def best_of(func, *args) -> float:
+    timings = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        func(*args)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+def vectorised(timestamps: np.ndarray, players: np.ndarray) -> None:
+    daily_peaks(timestamps, players, np.ones(len(timestamps), dtype=np.int64), TIMEZONE)
+    time_points(timestamps, players, TIMEZONE)
+
+def main() -> None:
+    rng = np.random.default_rng(0)
+    timestamps = START + np.arange(SAMPLES, dtype=np.int64) * 60
+    players = rng.integers(0, 500, SAMPLES, dtype=np.int64)
+
+    # The rows came out of SQLite with the local date and time already formatted, so that isn't timed
+    rows = []
+    for timestamp, count in zip(timestamps.tolist(), players.tolist()):
+        local = datetime.fromtimestamp(timestamp, TIMEZONE)
+        rows.append((count, local.strftime("%Y-%m-%d"), local.strftime("%H:%M")))
+
+    per_row = best_of(chart_data_from_res, rows)
+    fast = best_of(vectorised, timestamps, players)
+    print(f"      per row: {SAMPLES} samples in {per_row * 1000:.0f}ms")
+    print(f"   vectorised: {SAMPLES} samples in {fast * 1000:.0f}ms")
+    print(f"Speedup: {per_row / fast:.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""Compares the Pillow sparkline tier with the full Matplotlib chart on the same day of per-minute samples.
+
+Run it from the src folder: python -m benchmarks.sparkline
+"""
+from __future__ import annotations
+
+import numpy as np
+import subprocess
+import sys
+import time
+
+from helpers.chart import Mode, render_chart, time_points
+from helpers.sparkline import render_sparkline
+
+POINTS = 24 * 60
+RUNS = 20
+START = 1_704_067_200 # 2024-01-01 UTC
+
+def import_time(module: str) -> float:
+    # In a fresh interpreter, the first render of a process pays for the import
+    code = f"import time; start = time.perf_counter(); import {module}; print(time.perf_counter() - start)"
+    return float(subprocess.check_output([sys.executable, "-c", code]))
+
+def mean_time(func, *args, **kwargs) -> tuple:
+    start = time.perf_counter()
+    for _ in range(RUNS):
+        image = func(*args, **kwargs)
+    return (time.perf_counter() - start) / RUNS, len(image)
+
+def main() -> None:
+    rng = np.random.default_rng(0)
+    players = np.clip(np.cumsum(rng.integers(-2, 3, POINTS)) + 100, 0, None)
+    data = time_points(START + np.arange(POINTS, dtype=np.int64) * 60, players, None)
+
+    render_chart("2024-01-01", data, Mode.MODE_DAY) # Warm up the imports and font caches
+    results = {
+        "matplotlib": mean_time(render_chart, "2024-01-01", data, Mode.MODE_DAY),
+        "sparkline": mean_time(render_sparkline, data.players),
+        "bars": mean_time(render_sparkline, data.players[::60], bars=True),
+    }
+    for name, (seconds, size) in results.items():
+        print(f"{name:>10}: {seconds * 1000:.1f}ms per render, {size / 1024:.1f}KiB")
+
+    print(f"Speedup: {results['matplotlib'][0] / results['sparkline'][0]:.0f}x")
+    print(f"Import: matplotlib {import_time('matplotlib.figure') * 1000:.0f}ms, Pillow {import_time('PIL.ImageDraw') * 1000:.0f}ms")
+
+if __name__ == "__main__":
+    main()
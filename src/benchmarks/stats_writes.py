@@ -0,0 +1,60 @@
+"""Compares committing every statistics write on its own with the batched StatsWriter.
+
+Run it from the src folder: python -m benchmarks.stats_writes
+"""
+from __future__ import annotations
+
+import asyncio
+import asqlite
+import os
+import tempfile
+import time
+
+from helpers import migrations
+from helpers.writer import StatsWriter
+
+WRITES = 5000
+SERVERS = 500
+
+INSERT = "INSERT OR IGNORE INTO dailystats (ip, port, timestamp, playercount, online) VALUES (?, ?, ?, ?, ?)"
+
+def make_params(i: int) -> tuple:
+    return (f"127.0.{i % SERVERS // 256}.{i % 256}", 7777, 1_700_000_000 + i, i % 100, 1)
+
+async def prepare(database: str) -> None:
+    async with asqlite.connect(database) as conn:
+        await migrations.migrate(conn)
+
+async def per_statement(database: str) -> float:
+    # What update_daily_server_stats used to do: acquire, execute and commit once per guild per sample
+    async with asqlite.create_pool(database) as pool:
+        start = time.perf_counter()
+        for i in range(WRITES):
+            async with pool.acquire() as conn:
+                await conn.execute(INSERT, make_params(i))
+                await conn.commit()
+        return time.perf_counter() - start
+
+async def batched(database: str) -> float:
+    writer = StatsWriter(database, batch_size=500, flush_interval=2.0)
+    await writer.start()
+    start = time.perf_counter()
+    for i in range(WRITES):
+        await writer.submit(INSERT, make_params(i))
+    await writer.close() # Waits for the last batch to be committed
+    return time.perf_counter() - start
+
+async def main() -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        results = {}
+        for name, bench in (("per statement", per_statement), ("batched", batched)):
+            database = os.path.join(directory, f"{name}.db")
+            await prepare(database)
+            elapsed = await bench(database)
+            results[name] = WRITES / elapsed
+            print(f"{name:>14}: {WRITES} writes in {elapsed:.2f}s ({results[name]:.0f} writes/s)")
+
+        print(f"Speedup: {results['batched'] / results['per statement']:.1f}x")
+
+if __name__ == "__main__":
+    asyncio.run(main())
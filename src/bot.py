@@ -15,7 +15,15 @@ from helpers import (
     query,
     utils,
     log,
-    chart
+    chart,
+    metrics,
+    monitor,
+    writer,
+    maintenance,
+    series,
+    prerender,
+    startup,
+    heatmap
 )
 from pkgutil import iter_modules
 from typing import Dict, Optional, Dict, List, TYPE_CHECKING
@@ -26,6 +34,8 @@ if TYPE_CHECKING:
     from helpers import _types
     ServerData = _types.ServerData
 
+DATABASE = "./database/query.db"
+
 class QueryBotTree(app_commands.CommandTree):
     def __init__(self, bot: QueryBot) -> None:
         self.bot = bot
@@ -126,6 +136,8 @@ class QueryBot(commands.Bot):
         self.rcon_logged: Dict[int, Dict[int, Client]] = {}
         self.server_data: Dict[int, ServerData] = {} # Server info per guild
         self.chart = chart.Chart(self)
+        self.heatmaps = heatmap.Heatmaps(self)
+        self.loop_monitor = monitor.LoopMonitor(config.LOOP_MONITOR_INTERVAL, config.SLOW_CALLBACK_THRESHOLD, config.SLOW_CALLBACK_BUFFER)
 
         self._intents = discord.Intents.default()
         self._intents.message_content = True # For the on_message and on_message_delete events, if you don't want those events to run this can be disabled
@@ -144,20 +156,47 @@ class QueryBot(commands.Bot):
 
     async def on_ready(self) -> None:
         print(f"Logged in as {self.user}.", flush=True)
+        if startup.timings.enabled: # Only the first time, on_ready runs again after reconnects
+            startup.timings.stop()
+            self.logger.info(f"Startup timings:\n{startup.timings.report()}")
 
         if self.logger_webhook and self.user:
             timestamp = discord.utils.format_dt(self.start_time, style="R")
             await self.logger_webhook.send(f"The bot was initialized {timestamp}.", username=f"{self.user.name} Logger", avatar_url=self.user.avatar.url if self.user.avatar else None)
 
     async def setup_hook(self) -> None:
-        self.pool = await asqlite.create_pool("./database/query.db")
-        self.logger.info("Created database connection pool.")
-        async with self.pool.acquire() as conn:
-            await utils.set_up_database(conn)
+        self.loop_monitor.start()
+
+        with startup.timings.phase("database"):
+            self.pool = await asqlite.create_pool(DATABASE)
+            self.logger.info("Created database connection pool.")
+            async with self.pool.acquire() as conn:
+                for migration in await utils.set_up_database(conn):
+                    self.logger.info(f"Applied database migration {migration}.")
+
+        with startup.timings.phase("writer"):
+            self.writer = writer.StatsWriter(DATABASE, batch_size=config.WRITER_BATCH_SIZE, flush_interval=config.WRITER_FLUSH_INTERVAL, retries=config.WRITER_RETRIES, retry_delay=config.WRITER_RETRY_DELAY, logger=self.logger)
+            await self.writer.start()
+            self.logger.info("Started the statistics writer.")
+
+        self.series = None
+        if config.SERIES_DIRECTORY is not None:
+            with startup.timings.phase("series"):
+                self.series = series.SeriesStore(config.SERIES_DIRECTORY)
+                if not self.series.exists(): # First start with the store, bring the history over
+                    imported = await self.series.import_dailystats(self.pool)
+                    self.logger.info(f"Imported {imported} samples into the series store.")
+
+        self.maintenance = maintenance.Maintenance(self, DATABASE)
+        self.maintenance.start()
+
+        self.prerenderer = prerender.Prerenderer(self)
+        self.prerenderer.start()
         
         for extension in self._extensions:
             try:
-                await self.load_extension(extension)
+                with startup.timings.phase(extension):
+                    await self.load_extension(extension)
             except Exception:
                 self.logger.error(f"Unable to load extension {extension}.")
                 traceback.print_exc()
@@ -167,6 +206,12 @@ class QueryBot(commands.Bot):
         self._session = aiohttp.ClientSession()
         self.start_time = discord.utils.utcnow()
 
+        self.metrics_server = None
+        if config.METRICS_PORT is not None:
+            self.metrics_server = metrics.MetricsServer(config.METRICS_HOST, config.METRICS_PORT)
+            await self.metrics_server.start()
+            self.logger.info(f"Serving metrics on {config.METRICS_HOST}:{config.METRICS_PORT}.")
+
         self.startup_task.start() # Start the start-up task in an async context
 
         self.logger_webhook = None
@@ -188,6 +233,8 @@ class QueryBot(commands.Bot):
         handler.setLevel(logging.INFO)
         handler.setFormatter(log.Logger()) 
         self.logger.addHandler(handler)
+
+        logging.getLogger("discord.http").addHandler(metrics.RateLimitCounter())
     
     async def log_error_via_webhook(self, func_name: str, tb: str, *args, **kwargs) -> None:
         header = f"Ignoring exception in {func_name}"
@@ -1,8 +1,29 @@
-from ._types import *
-from .config import *
-from .errors import *
-from .log import *
-from .query import *
-from .status import *
-from .utils import *
-from .chart import *
\ No newline at end of file
+import importlib
+
+# The names which can be imported from the package itself, by the module they're defined in. A module is only
+# imported once one of its names is used, so importing a single helper doesn't import NumPy, discord.py and the
+# rest with it. Submodules (from helpers import utils) are imported by the import system as usual.
+_EXPORTS = {
+    "ServerData": "_types",
+    "StatusChannelNotFound": "errors",
+    "ServerOffline": "errors",
+    "ChartNotFound": "errors",
+    "Logger": "log",
+    "Query": "query",
+    "Status": "status",
+    "StatusView": "utils",
+    "Chart": "chart",
+    "ChartData": "render",
+    "Mode": "render",
+    "Activity": "cadence",
+    "Cadence": "cadence",
+}
+
+def __getattr__(name: str):
+    try:
+        module_name = _EXPORTS[name]
+    except KeyError:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None
+
+    value = globals()[name] = getattr(importlib.import_module(f".{module_name}", __name__), name)
+    return value
@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+import numpy as np
+
+from typing import List, Sequence, Tuple
+
+# A day of samples of a server packed into one blob:
+#   varint count, varint first epoch,
+#   count - 1 varint epoch deltas, count zigzag varint player count deltas,
+#   a bitmap of the online flags, one bit per sample.
+# Samples are an hour or a minute apart and player counts move slowly, so most values fit in one byte.
+
+Sample = Tuple[int, int, int] # (epoch, players, online)
+
+def _write_varint(out: bytearray, value: int) -> None:
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+def _read_varint(data: bytes, pos: int) -> Tuple[int, int]:
+    value = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+def _zigzag(value: int) -> int:
+    return value * 2 if value >= 0 else -value * 2 - 1
+
+def _unzigzag(value: int) -> int:
+    return value >> 1 if not value & 1 else -(value >> 1) - 1
+
+def encode_day(samples: Sequence[Sample]) -> bytes:
+    """Packs the samples, which must be sorted by their epoch."""
+    out = bytearray()
+    _write_varint(out, len(samples))
+    if not samples:
+        return bytes(out)
+
+    _write_varint(out, samples[0][0])
+    for previous, sample in zip(samples, samples[1:]):
+        _write_varint(out, sample[0] - previous[0])
+
+    players = 0
+    for sample in samples:
+        _write_varint(out, _zigzag(sample[1] - players))
+        players = sample[1]
+
+    out.extend(np.packbits(np.array([sample[2] for sample in samples], dtype=np.uint8)).tobytes())
+    return bytes(out)
+
+def decode_day(data: bytes) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Returns the epochs, player counts and online flags of a blob made by encode_day."""
+    count, pos = _read_varint(data, 0)
+    deltas: List[int] = []
+    if count:
+        first, pos = _read_varint(data, pos)
+        deltas.append(first)
+        for _ in range(count - 1):
+            delta, pos = _read_varint(data, pos)
+            deltas.append(delta)
+
+    changes: List[int] = []
+    for _ in range(count):
+        change, pos = _read_varint(data, pos)
+        changes.append(_unzigzag(change))
+
+    online = np.unpackbits(np.frombuffer(data, dtype=np.uint8, offset=pos), count=count)
+    return np.cumsum(deltas, dtype=np.int64), np.cumsum(changes, dtype=np.int64), online.astype(np.int64)
+
+def merge_day(data: bytes, samples: Sequence[Sample]) -> bytes:
+    """Adds samples to an encoded day, the ones already in it win."""
+    epochs, players, online = decode_day(data)
+    merged = {sample[0]: sample for sample in samples}
+    merged.update((epoch, (epoch, player, flag)) for epoch, player, flag in zip(epochs.tolist(), players.tolist(), online.tolist()))
+    return encode_day([merged[epoch] for epoch in sorted(merged)])
@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+import time
+
+from typing import Dict, Hashable, Optional
+from . import config
+
+SMOOTHING = 0.3 # Weight of the newest sample in the player count change rate
+
+class Activity:
+    """A class for storing the recent activity of a polled server."""
+    def __init__(self) -> None:
+        self.last_players: Optional[int] = None
+        self.change_rate: float = 0.0 # Smoothed number of players that joined or left between two polls
+        self.idle_polls: int = 0 # Consecutive polls with no players online
+        self.offline_since: Optional[float] = None
+
+class Cadence:
+    """Works out how often a job should poll its server.
+
+    Jobs speed up while the player count changes quickly and slow down for empty or offline servers.
+    The global query budget stretches every interval once the fleet asks for more polls per second than allowed.
+    """
+    def __init__(self) -> None:
+        self.activity: Dict[Hashable, Activity] = {}
+        self.demand: Dict[Hashable, float] = {} # Polls per second wanted by each job before the budget is applied
+
+    def observe(self, key: Hashable, players: Optional[int]) -> None:
+        """Records the result of a poll, players should be None if the server was offline."""
+        activity = self.activity.setdefault(key, Activity())
+
+        if players is None:
+            if activity.offline_since is None:
+                activity.offline_since = time.monotonic()
+            activity.last_players = None
+            return
+
+        activity.offline_since = None
+        if activity.last_players is not None:
+            delta = abs(players - activity.last_players)
+            activity.change_rate = SMOOTHING * delta + (1 - SMOOTHING) * activity.change_rate
+
+        activity.idle_polls = activity.idle_polls + 1 if players == 0 else 0
+        activity.last_players = players
+
+    def desired_interval(self, key: Hashable, lower: float, upper: float) -> float:
+        activity = self.activity.get(key)
+        if activity is None: # Nothing is known about the server yet
+            return lower
+
+        if activity.offline_since is not None:
+            if time.monotonic() - activity.offline_since >= config.ADAPTIVE_OFFLINE_AFTER:
+                return upper
+            return (lower + upper) / 2
+
+        if activity.idle_polls >= config.ADAPTIVE_IDLE_POLLS:
+            return upper
+
+        busyness = min(1.0, activity.change_rate / config.ADAPTIVE_BUSY_CHANGE)
+        return upper - (upper - lower) * busyness
+
+    def interval(self, key: Hashable, lower: float, upper: float) -> float:
+        """Returns the number of seconds the job should wait before polling again, always between lower and upper."""
+        desired = self.desired_interval(key, lower, upper)
+        self.demand[key] = 1 / desired
+
+        stretch = max(1.0, sum(self.demand.values()) / config.QUERY_BUDGET)
+        return min(max(desired * stretch, lower), upper)
+
+    def forget(self, key: Hashable) -> None:
+        self.activity.pop(key, None)
+        self.demand.pop(key, None)
@@ -1,139 +1,326 @@
 from __future__ import annotations
 
-import matplotlib
-matplotlib.use('agg')
-from matplotlib import pyplot as plt
-plt.ioff()
-
+import asyncio
 import discord
+import hashlib
+import io
+import multiprocessing
+import numpy as np
 import os
+import time
+
+from concurrent.futures import ProcessPoolExecutor
 
-from enum import Enum
-from typing import List, Dict, Union, TYPE_CHECKING
+from helpers import utils as _utils
+from datetime import date, datetime, timedelta, timezone, tzinfo
+from typing import List, Dict, Optional, Sequence, TYPE_CHECKING
 from .errors import ChartNotFound
+from . import config
+from .metrics import CHART_RENDER, RENDER_QUEUE
+from .series import EMPTY
+from .archive import decode_day
+from .chart_cache import ChartCache
+from .render import ChartData, Mode, render_chart
+from .sparkline import render_sparkline
 
 if TYPE_CHECKING:
     from bot import QueryBot
-    from sqlite3 import Row
 
-# Modes for chart making
-class Mode(Enum):
-    MODE_MONTH = 1
-    MODE_DAY = 2
+FAST_MODES = (Mode.MODE_SPARKLINE, Mode.MODE_BARS)
+
+RENDER_VERSION = 2 # Part of the cache keys, bump it when render_chart draws differently so cached charts aren't reused
+
+MAX_CHART_POINTS = 720 # Time points drawn at most, longer charts are downsampled to it so they render in about the same time
+
+DST_FREE_SPAN = 7 * 86400 # Offsets equal at both ends of a span this short are assumed to hold in between
+
+def utc_offsets(timestamps: np.ndarray, tz: Optional[tzinfo]) -> np.ndarray:
+    """Returns the UTC offset of the timezone (in seconds) at each of the sorted timestamps.
+
+    Offsets only change at DST transitions, so they're looked up at the ends of spans which are bisected
+    until they're short and constant, instead of once per timestamp.
+    """
+    offsets = np.empty(len(timestamps), dtype=np.int64)
+
+    def offset(i: int) -> int:
+        local = datetime.fromtimestamp(int(timestamps[i]), timezone.utc).astimezone(tz) # None is the bot's local time
+        return int(local.utcoffset().total_seconds()) # type: ignore
+
+    spans = [(0, len(timestamps) - 1)] if len(timestamps) else []
+    while spans:
+        lo, hi = spans.pop()
+        lo_offset, hi_offset = offset(lo), offset(hi)
+        if lo_offset == hi_offset and timestamps[hi] - timestamps[lo] <= DST_FREE_SPAN:
+            offsets[lo:hi + 1] = lo_offset
+        elif hi - lo <= 1:
+            offsets[lo], offsets[hi] = lo_offset, hi_offset
+        else:
+            mid = (lo + hi) // 2
+            spans.append((lo, mid))
+            spans.append((mid + 1, hi))
+
+    return offsets
+
+def utc_midnight(day: date) -> int:
+    """Returns the timestamp at which the day starts in UTC, the start of its daily rollup."""
+    return int(datetime.combine(day, datetime.min.time(), timezone.utc).timestamp())
+
+MINUTE_LABELS = np.array([f"{minute // 60:02}:{minute % 60:02}" for minute in range(1440)]) # Time points labelled by the minute of the day
+DAY_LABELS = np.array([f"{day:02} " for day in range(1, 32)]) # Prefixes of the time points of charts spanning more than a day
+
+def daily_peaks(timestamps: np.ndarray, players: np.ndarray, samples: np.ndarray, tz: Optional[tzinfo]) -> ChartData:
+    """Groups the sorted samples by the local day they were taken in, keeping the peak and the number of samples of each."""
+    if not len(timestamps):
+        return ChartData()
 
-class ChartData:
-    """A class for storing chart data of a day."""
-    def __init__(self) -> None:
-        self.max_playercount: int = 0
-        self.time_data: Dict[str, int] = {}
+    days = (timestamps + utc_offsets(timestamps, tz)) // 86400
+    if np.all(days[1:] >= days[:-1]): # Sorted, the days are runs which are reduced in place
+        starts = np.flatnonzero(np.diff(days, prepend=-1))
+        peaks = np.maximum.reduceat(players, starts)
+        counts = np.add.reduceat(samples, starts)
+        days = days[starts]
+    else: # A DST change at midnight took the local time back into the previous day
+        days, day_index = np.unique(days, return_inverse=True)
+        peaks = np.zeros(len(days), dtype=np.int64)
+        np.maximum.at(peaks, day_index, players)
+        counts = np.bincount(day_index, weights=samples, minlength=len(days)).astype(np.int64)
+
+    return ChartData(np.datetime_as_string(days.astype("datetime64[D]")), peaks.astype(np.int64), counts.astype(np.int64))
+
+def time_points(timestamps: np.ndarray, players: np.ndarray, tz: Optional[tzinfo], *, with_day: bool = False) -> ChartData:
+    """Labels each of the sorted samples by its local time, and by the day of the month as well if with_day is set."""
+    local = timestamps + utc_offsets(timestamps, tz)
+    labels = MINUTE_LABELS[local % 86400 // 60]
+    if with_day:
+        dates = local.astype("datetime64[s]").astype("datetime64[D]")
+        labels = np.char.add(DAY_LABELS[(dates - dates.astype("datetime64[M]")).astype(np.int64)], labels)
+
+    return ChartData(labels, players.astype(np.int64))
 
 class Chart:
     def __init__(self, bot: QueryBot) -> None:
         self.bot = bot
+        self.pool: Optional[ProcessPoolExecutor] = None # Started on the first render
+        self.slots = asyncio.Semaphore(config.CHART_QUEUE_SIZE)
+        self.cache = ChartCache(config.CHART_CACHE_SIZE, config.CHART_CACHE_DIRECTORY, config.CHART_CACHE_DISK_SIZE)
+        self.rendering: Dict[str, asyncio.Task[bytes]] = {} # Renders in progress by their cache key
+        self.queued = 0 # Renders queued or running, pre-rendering waits for them
 
-    def chart_data_from_res(self, res: List[Row]) -> Dict[str, ChartData]:
-        filtered: Dict[str, ChartData] = {}
-
-        current_date = ""
-        for i, data in enumerate(res):
-            if not current_date: # In the first iteration, this if condition would run and the current_date would be the first date received
-                current_date = data[1] # data[1] is the date
-                chart_data = ChartData()
-
-            if data[1] == current_date: # This if condition will keep on running until the date changes
-                chart_data.time_data[data[2]] = data[0]
-            else: # When the date changes, save it into the dictionary and move on to the next date
-                chart_data.max_playercount = max([i for i in chart_data.time_data.values()])
-                filtered[current_date] = chart_data
-
-                current_date = data[1]
-                chart_data = ChartData() # create new instance
-                chart_data.time_data[data[2]] = data[0] # data[2] is the time in 'hour:minute:' format and data[0] is the playercount
-
-            # Check if this is the last item
-            if (len(res) - 1) == i:
-                chart_data.max_playercount = max([i for i in chart_data.time_data.values()])
-                filtered[current_date] = chart_data 
-                
-        return filtered
-    
-    def can_chart_be_made(self, data: Union[Dict[str, ChartData], ChartData], mode: Mode = Mode.MODE_MONTH) -> bool:
-        if mode == Mode.MODE_MONTH:
-            return len(data) >= 6 # type: ignore
-        else:
-            return len(data.time_data) >= 6 # type: ignore
+    async def fetch_month(self, ip: str, port: int, tz: Optional[tzinfo], year: int, month: int) -> ChartData:
+        """Returns the highest player count and the number of samples of each day of the month, read from the hourly rollups."""
+        start, end = _utils.month_bounds(year, month, tz)
+
+        async with self.bot.pool.acquire() as conn:
+            res = await conn.fetchall(
+                "SELECT hour, max_players, samples FROM rollup_hourly WHERE ip = ? AND port = ? AND hour >= ? AND hour < ? ORDER BY hour",
+                (ip, port, start, end)
+            )
+
+        if not res:
+            return ChartData()
+
+        # An hour belongs to the local day it starts in
+        hours, max_players, samples = np.array(res, dtype=np.int64).T
+        return daily_peaks(hours, max_players, samples, tz)
+
+    async def fetch_day(self, ip: str, port: int, tz: Optional[tzinfo], date: str) -> ChartData:
+        """Returns every time point recorded in the day (in the %Y-%m-%d format)."""
+        try:
+            start, end = _utils.day_bounds(date, tz)
+        except ValueError:
+            raise ChartNotFound(f"{date} is not a valid date.")
+
+        samples = self.bot.series.read(ip, port, start, end) if self.bot.series is not None else EMPTY
+        if len(samples):
+            playercounts, timestamps = samples["players"].astype(np.int64), samples["epoch"].astype(np.int64)
+        else: # Not in the store, the samples may predate it
+            async with self.bot.pool.acquire() as conn:
+                raw = await conn.fetchall(
+                    "SELECT timestamp, playercount FROM dailystats WHERE ip = ? AND port = ? AND timestamp >= ? AND timestamp < ? ORDER BY timestamp",
+                    (ip, port, start, end)
+                )
+                # Past the retention of the raw samples they're archived by UTC day, a local day can be archived in part
+                archived = await conn.fetchall("SELECT data FROM archive WHERE ip = ? AND port = ? AND day >= ? AND day < ? ORDER BY day", (ip, port, start - start % 86400, end))
+
+            parts = [decode_day(row[0])[:2] for row in archived]
+            if raw:
+                parts.append(tuple(np.array(raw, dtype=np.int64).T))
+            if not parts:
+                return ChartData()
+
+            timestamps, playercounts = (np.concatenate(arrays) for arrays in zip(*parts))
+            # The archived days come before the raw samples, so the in-day samples are in order already
+            in_day = (timestamps >= start) & (timestamps < end)
+            timestamps, playercounts = timestamps[in_day], playercounts[in_day]
+
+        return time_points(timestamps, playercounts, tz)
     
-    def get_logged_days(self, data: Dict[str, ChartData]) -> List[str]:
-        days = []
-        for key in data.keys():
-            days.append("-".join(key.split("-")[::-1])) # Reverse the date
+    def recent_chart_data(self, ip: str, port: int, tz: Optional[tzinfo], hours: int) -> ChartData:
+        """Returns the per-minute time points of the last hours."""
+        now = int(time.time())
+        epochs, players, _ = self.bot._status.recent.window((ip, port), now - hours * 3600, now + 1)
+        # Past a day the same minute comes back, so the day of the month is added to it
+        return time_points(epochs, players, tz, with_day=hours > 24)
+
+    async def fetch_hours(self, ip: str, port: int, tz: Optional[tzinfo], hours: int) -> ChartData:
+        """Returns the highest player count of each of the last hours, read from the hourly rollups."""
+        now = int(time.time())
+        async with self.bot.pool.acquire() as conn:
+            res = await conn.fetchall(
+                "SELECT hour, max_players FROM rollup_hourly WHERE ip = ? AND port = ? AND hour > ? ORDER BY hour",
+                (ip, port, now - hours * 3600)
+            )
 
-        return days
+        if not res:
+            return ChartData()
+
+        starts, max_players = np.array(res, dtype=np.int64).T
+        return time_points(starts, max_players, tz, with_day=hours > 24)
+
+    async def fetch_range(self, ip: str, port: int, tz: Optional[tzinfo], first: date, last: date) -> ChartData:
+        """Returns the player counts from the first to the last day, hourly peaks for short ranges and daily peaks for the longer ones.
+
+        Daily peaks are aggregated from the hourly rollups RANGE_CHUNK_DAYS at a time, and taken from the daily
+        rollups (in UTC days) for the days before the first whole local day of the hourly ones. The range is cut down to the days
+        from the first one the server was recorded in to today, so its length is bounded by the history.
+        """
+        async with self.bot.pool.acquire() as conn:
+            res = await conn.fetchone("SELECT MIN(day) FROM rollup_daily WHERE ip = ? AND port = ?", (ip, port))
+
+        if res is None or res[0] is None:
+            return ChartData()
+
+        first = max(first, _utils.to_local(res[0], tz).date() - timedelta(days=1)) # The UTC day may start the day before locally
+        last = min(last, datetime.now(tz).date())
+        if first > last:
+            return ChartData()
+
+        if (last - first).days < config.RANGE_HOURLY_DAYS:
+            start, end = _utils.range_bounds(first, last, tz)
+            async with self.bot.pool.acquire() as conn:
+                res = await conn.fetchall(
+                    "SELECT hour, max_players FROM rollup_hourly WHERE ip = ? AND port = ? AND hour >= ? AND hour < ? ORDER BY hour",
+                    (ip, port, start, end)
+                )
+
+            if not res:
+                return ChartData()
+
+            hours, max_players = np.array(res, dtype=np.int64).T
+            return time_points(hours, max_players, tz, with_day=True)
+
+        chunks: List[ChartData] = []
+        async with self.bot.pool.acquire() as conn:
+            # The days before the first whole local day of the hourly rollups were pruned from them, in full or in part
+            res = await conn.fetchone("SELECT MIN(hour) FROM rollup_hourly WHERE ip = ? AND port = ?", (ip, port))
+            hourly_first = last + timedelta(days=1)
+            if res is not None and res[0] is not None:
+                hourly_first = _utils.to_local(res[0], tz).date()
+                if _utils.range_bounds(hourly_first, hourly_first, tz)[0] < res[0]:
+                    hourly_first += timedelta(days=1)
+
+            if first < hourly_first: # Past the retention of the hourly rollups
+                # The daily rollups are UTC days labelled by their date, only the dates before hourly_first are read so none is charted twice
+                daily_last = min(hourly_first - timedelta(days=1), last)
+                res = await conn.fetchall(
+                    "SELECT day, max_players, samples FROM rollup_daily WHERE ip = ? AND port = ? AND day >= ? AND day < ? ORDER BY day",
+                    (ip, port, utc_midnight(first), utc_midnight(daily_last + timedelta(days=1)))
+                )
+                if res:
+                    days, max_players, samples = np.array(res, dtype=np.int64).T
+                    chunks.append(ChartData(np.datetime_as_string(days.astype("datetime64[s]").astype("datetime64[D]")), max_players, samples))
+
+            chunk_first = max(first, hourly_first)
+            while chunk_first <= last:
+                chunk_last = min(chunk_first + timedelta(days=config.RANGE_CHUNK_DAYS - 1), last)
+                start, end = _utils.range_bounds(chunk_first, chunk_last, tz)
+                res = await conn.fetchall(
+                    "SELECT hour, max_players, samples FROM rollup_hourly WHERE ip = ? AND port = ? AND hour >= ? AND hour < ? ORDER BY hour",
+                    (ip, port, start, end)
+                )
+                if res:
+                    hours, max_players, samples = np.array(res, dtype=np.int64).T
+                    chunks.append(daily_peaks(hours, max_players, samples, tz))
+
+                chunk_first = chunk_last + timedelta(days=1)
+
+        if not chunks:
+            return ChartData()
+
+        return ChartData(*(np.concatenate(arrays) for arrays in zip(*((chunk.labels, chunk.players, chunk.samples) for chunk in chunks))))
+
+    def can_chart_be_made(self, data: ChartData) -> bool:
+        return len(data) >= 6 # Days for month charts, time points for the others
     
-    def round_to_lowest_hundred(self, num: int) -> int: # Used for chart y tick increment
-        num -= num % 100
-        return num
-
-    def get_y_ticks(self, num: List[int]) -> range:
-        if max(num) <= 5:
-            return range(0, 6, 1)
-        
-        if max(num) <= 10:
-            return range(0, 11, 2)
-        
-        if max(num) <= 50:
-            return range(0, 51, 5)
-        
-        # Y ticks if the max playercount is bigger than 100
-
-        if max(num) >= 100:
-            return range(0, max(num) + 1, self.round_to_lowest_hundred(max(num)) // 10)
-        
-        return range(0, max(num) + 10, 10) # > 10 and < 100
-        
-    def make_chart_from_data(self, guild_id: int, header: str, data: Dict[str, ChartData], mode: Mode = Mode.MODE_MONTH) -> discord.File:
-        if mode == Mode.MODE_MONTH:
-            player_counts, dates = [], []
-            for k, v in data.items():
-                date = k[5:].split("-")[::-1]
-                dates.append("-".join(date)) # Remove the year and put it in the format of DD-MM
-                player_counts.append(v.max_playercount)
-
-            x_axis = dates
-            x_label = "Dates"
-        
-        else:
-            day_data = data.get(header, None)
-            if not day_data:
-                raise ChartNotFound(f"Data for {header} wasn't found.")
-            player_counts, time_points = [], []
-            for k, v in day_data.time_data.items():
-                time_points.append(k)
-                player_counts.append(v)
-
-            x_axis = time_points
-            x_label = "Time Points"
-
-            # After getting the data, format the date
-            header = "-".join(header.split("-")[::-1])
-
-        plt.figure(figsize=(len(x_axis) / 2 + 5, 7))
-        plt.plot(x_axis, player_counts, marker='o', linestyle='-', color='tab:blue', markersize=8, linewidth=2)
-        plt.yticks(self.get_y_ticks(player_counts))
-        plt.grid(True, linestyle='--', alpha=0.7)
-        plt.title(f'Server Player Count On {header}', fontsize=16)
-        plt.xlabel(x_label, fontsize=14, fontweight='bold', color='darkslategray')
-        plt.ylabel('Player Count', fontsize=14, fontweight='bold', color='darkslategray')
-        plt.legend(['Player Count'], loc='upper right')
-
-        # Adjust layout to prevent clipping of labels
-        plt.tight_layout()
-
-        dir = f"./charts/{guild_id}.png"
-        if not os.path.exists(r"./charts"):
-            os.mkdir(r"./charts")
-
-        plt.savefig(dir)
-
-        return discord.File(dir, filename="chart.png")
+    def get_logged_days(self, days: Sequence[str]) -> List[str]:
+        return ["-".join(day.split("-")[::-1]) for day in days] # Reverse the dates
+
+    async def make_chart_from_data(self, header: str, data: ChartData, mode: Mode = Mode.MODE_MONTH) -> discord.File:
+        return discord.File(io.BytesIO(await self.chart_image(header, data, mode)), filename="chart.png")
+
+    async def chart_image(self, header: str, data: ChartData, mode: Mode) -> bytes:
+        """Returns the chart from the cache, or renders it if it wasn't made from this data before."""
+        key = chart_key(header, data, mode)
+        image = await self.cache.get(key)
+        if image is not None:
+            return image
+
+        try: # The same chart may be rendering for someone else already
+            task = self.rendering[key]
+        except KeyError:
+            task = self.rendering[key] = asyncio.create_task(self._render_into_cache(key, header, data, mode))
+            task.add_done_callback(_retrieve_exception)
+
+        # Shielded, a requester giving up doesn't cancel the render the others are waiting for
+        return await asyncio.shield(task)
+
+    async def _render_into_cache(self, key: str, header: str, data: ChartData, mode: Mode) -> bytes:
+        try:
+            image = await self.render(header, data, mode)
+            await self.cache.put(key, image)
+            return image
+        finally:
+            del self.rendering[key]
+
+    async def render(self, header: str, data: ChartData, mode: Mode) -> bytes:
+        """Renders the chart in the chart process pool, waiting for a slot if CHART_QUEUE_SIZE renders are already queued.
+
+        The fast modes take a few milliseconds, they're drawn right away instead.
+        """
+        if mode in FAST_MODES:
+            with CHART_RENDER.time(mode.name.lower()):
+                return render_sparkline(data.players, bars=mode == Mode.MODE_BARS)
+
+        if self.pool is None:
+            # Spawned rather than forked, a fork would copy the bot's threads and the locks they hold
+            self.pool = ProcessPoolExecutor(max_workers=config.CHART_WORKERS or os.cpu_count(), mp_context=multiprocessing.get_context("spawn"))
+
+        data = data.downsample(MAX_CHART_POINTS) # Before it's sent, a year of samples is a lot to pickle
+        RENDER_QUEUE.inc()
+        self.queued += 1
+        try:
+            with CHART_RENDER.time(mode.name.lower()):
+                async with self.slots:
+                    # Not run_in_executor, trio_asyncio's loop only accepts its own executors there
+                    return await asyncio.wrap_future(self.pool.submit(render_chart, header, data, mode))
+        finally:
+            RENDER_QUEUE.dec()
+            self.queued -= 1
+
+    def close(self) -> None:
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = None
+
+def _retrieve_exception(task: asyncio.Task) -> None:
+    # Whoever awaited the render got the exception already, and if nobody did it isn't worth a warning
+    if not task.cancelled():
+        task.exception()
+
+def chart_key(header: str, data: ChartData, mode: Mode) -> str:
+    """Returns a hash of everything the chart is drawn from, equal data gives an equal key."""
+    key = hashlib.blake2b(repr((RENDER_VERSION, header, mode.value)).encode(), digest_size=16)
+    key.update("\0".join(data.labels.tolist()).encode())
+    key.update(data.players.tobytes())
+    return key.hexdigest()
 
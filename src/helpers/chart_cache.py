@@ -0,0 +1,136 @@
+from __future__ import annotations
+
+import asyncio
+import os
+
+from collections import OrderedDict
+from typing import List, Optional
+from .metrics import CACHE_REQUESTS
+
+class ChartCache:
+    """Rendered charts keyed by a hash of what they were drawn from, in memory and optionally on disk.
+
+    A chart whose data changed gets a new key, so nothing has to be invalidated, stale entries just age out.
+    Both tiers are bounded in bytes and evict the least recently used charts first. The files on disk are
+    tracked in memory, so only reading and writing them touches the disk, and that's done off the event loop.
+    """
+    def __init__(self, max_bytes: int, directory: Optional[str] = None, max_disk_bytes: int = 0) -> None:
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.max_disk_bytes = max_disk_bytes
+        self.images: OrderedDict[str, bytes] = OrderedDict()
+        self.size = 0
+        self.files: Optional[OrderedDict[str, int]] = None # Sizes of the charts on disk, oldest use first, listed on the first use
+        self.disk_size = 0
+
+    async def get(self, key: str) -> Optional[bytes]:
+        try:
+            image = self.images[key]
+        except KeyError:
+            pass
+        else:
+            self.images.move_to_end(key)
+            CACHE_REQUESTS.inc("chart", "hit")
+            return image
+
+        image = await self._read(key)
+        if image is None:
+            CACHE_REQUESTS.inc("chart", "miss")
+            return None
+
+        CACHE_REQUESTS.inc("chart", "disk_hit")
+        self._remember(key, image)
+        return image
+
+    async def put(self, key: str, image: bytes) -> None:
+        self._remember(key, image)
+        await self._write(key, image)
+
+    def _remember(self, key: str, image: bytes) -> None:
+        if key in self.images:
+            self.images.move_to_end(key)
+            return
+
+        self.images[key] = image
+        self.size += len(image)
+        while self.size > self.max_bytes and self.images:
+            _, evicted = self.images.popitem(last=False)
+            self.size -= len(evicted)
+
+    def _path(self, key: str) -> str:
+        assert self.directory
+        return os.path.join(self.directory, f"{key}.png")
+
+    async def _index(self) -> OrderedDict[str, int]:
+        if self.files is None:
+            files = await asyncio.to_thread(self._scan)
+            if self.files is None: # Unless another call listed them meanwhile
+                self.files = files
+                self.disk_size = sum(files.values())
+
+        return self.files
+
+    def _scan(self) -> OrderedDict[str, int]:
+        assert self.directory
+        os.makedirs(self.directory, exist_ok=True)
+        entries = [(entry.stat(), entry.name) for entry in os.scandir(self.directory) if entry.name.endswith(".png")]
+        # The modification time is the last use, it keeps the order across restarts
+        entries.sort(key=lambda entry: entry[0].st_mtime)
+        return OrderedDict((name[:-4], stat.st_size) for stat, name in entries)
+
+    async def _read(self, key: str) -> Optional[bytes]:
+        if self.directory is None:
+            return None
+
+        files = await self._index()
+        if key not in files:
+            return None
+
+        files.move_to_end(key)
+        return await asyncio.to_thread(self._read_file, self._path(key))
+
+    def _read_file(self, path: str) -> Optional[bytes]:
+        try:
+            with open(path, "rb") as file:
+                image = file.read()
+            os.utime(path)
+        except OSError: # Evicted meanwhile
+            return None
+
+        return image
+
+    async def _write(self, key: str, image: bytes) -> None:
+        if self.directory is None:
+            return
+
+        files = await self._index()
+        if key in files:
+            files.move_to_end(key)
+            return
+
+        files[key] = len(image)
+        self.disk_size += len(image)
+        evicted: List[str] = []
+        while self.disk_size > self.max_disk_bytes and len(files) > 1:
+            old, size = files.popitem(last=False)
+            self.disk_size -= size
+            evicted.append(self._path(old))
+
+        await asyncio.to_thread(self._write_file, self._path(key), image, evicted)
+
+    def _write_file(self, path: str, image: bytes, evicted: List[str]) -> None:
+        try:
+            with open(path, "wb") as file:
+                file.write(image)
+        except OSError: # Only the disk tier misses the chart, reading it back fails the same way
+            pass
+
+        for old in evicted:
+            try:
+                os.remove(old)
+            except FileNotFoundError:
+                pass
+
+    def clear(self) -> None:
+        self.images.clear()
+        self.size = 0
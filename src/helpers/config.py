@@ -4,9 +4,68 @@ PREFIX = "." # Used only for the sync command
 # Used for logging, let it stay None if you don't want a webhook
 LOGGER_WEBHOOK = None
 
+# Prometheus metrics endpoint, let the port stay None if you don't want it
+METRICS_HOST = "127.0.0.1"
+METRICS_PORT = None
+
+# Statistics writer, samples are committed in batches so up to WRITER_FLUSH_INTERVAL seconds of them can be lost on a crash
+WRITER_BATCH_SIZE = 500 # Writes committed together at most
+WRITER_FLUSH_INTERVAL = 2.0 # Seconds after its first write that a batch is committed
+WRITER_RETRIES = 3 # Attempts at committing a batch before its writes are committed one by one
+WRITER_RETRY_DELAY = 0.5 # Seconds before the second attempt, growing by as much with every further one
+
+# Memory-mapped per-server sample files, day charts are made from them before the raw samples and the archive are read.
+# They are never pruned (about 1KB per server and day), let it stay None to only use the database
+SERIES_DIRECTORY = "./database/series"
+
+# Every statistics query is kept per minute in memory for the last hours chart, and flushed to the series store downsampled
+RECENT_HOURS = 48 # Hours of per-minute player counts kept for each server
+RECENT_FLUSH_RESOLUTION = 600 # Seconds of per-minute samples merged (peak player count) into one sample of the series store
+
+# Charts are rendered in a pool of processes
+CHART_WORKERS = None # Number of processes, None uses every core
+CHART_QUEUE_SIZE = 16 # Renders queued or running at most, the next ones wait for a slot
+CHART_CACHE_SIZE = 32 * 1024 * 1024 # Bytes of rendered charts kept in memory
+CHART_CACHE_DIRECTORY = None # Let it stay None to only cache in memory, otherwise charts evicted from memory are kept there
+CHART_CACHE_DISK_SIZE = 512 * 1024 * 1024 # Bytes of rendered charts kept on disk
+
+# Charts of longer ranges, up to RANGE_HOURLY_DAYS they have a point per hour and past it a point per day
+RANGE_HOURLY_DAYS = 31
+RANGE_CHUNK_DAYS = 31 # Days of hourly rollups read and aggregated at once, so a long range is never loaded whole
+
+# Charts of finished days and months are rendered in the background once their data is complete, let the interval stay None to only render on request
+PRERENDER_INTERVAL = 10 # Minutes between the runs, a day or month is rendered in the first run after it ends in the guild's timezone
+PRERENDER_WARM_CHARTS = 10 # Most requested charts of the current month which are rendered again in every run
+PRERENDER_PAUSE = 1.0 # Seconds between two renders, so they only use the pool while nobody is waiting for it
+
+# Retention, the rollups keep the daily and monthly history forever
+RAW_RETENTION_DAYS = 35 # Days the raw samples are kept for, older ones are archived per day and decoded for the day charts without a series store
+HOURLY_RETENTION_DAYS = 400 # Days the hourly rollups are kept for, charts of older months can't be made
+RETENTION_BATCH_SIZE = 5000 # Rows deleted per statement when pruning
+RETENTION_BATCH_PAUSE = 0.5 # Seconds to wait between two batches so the writer isn't starved
+MAINTENANCE_HOUR = 4 # Hour of the day (UTC) at which the history is pruned and the database is compacted, pick a quiet one
+
+# Logs how long the imports (per package) and every step of the setup hook took once the bot is ready
+STARTUP_TIMINGS = False
+
+# Event loop monitor
+LOOP_MONITOR_INTERVAL = 0.25 # How often the event loop heartbeat is scheduled (in seconds)
+SLOW_CALLBACK_THRESHOLD = 0.25 # A heartbeat late by more than this is a stall and the offending stack is captured (in seconds)
+SLOW_CALLBACK_BUFFER = 20 # The number of worst stalls to keep
+
 # Bug report channel
 BUG_REPORT_CHANNEL = 0
 
+# Adaptive polling
+
+STATUS_MIN_INTERVAL = 5 # The fastest a status message is refreshed (in minutes), the guild's interval is the slowest
+STATS_MIN_INTERVAL = 60 # The fastest the statistics of a server are sampled (in seconds)
+STATS_MAX_INTERVAL = 900 # The slowest the statistics of an idle or offline server are sampled (in seconds)
+QUERY_BUDGET = 5.0 # The maximum number of server queries per second across all the tasks
+ADAPTIVE_BUSY_CHANGE = 5 # Players joining or leaving between polls at which a server is polled at the fastest rate
+ADAPTIVE_IDLE_POLLS = 10 # Polls without any players online after which a server is polled at the slowest rate
+ADAPTIVE_OFFLINE_AFTER = 3600 # Seconds a server has to be offline for before it is polled at the slowest rate
+
 # Emojis
 
 REACTION_FAILURE = "" # The emoji to use if an interaction fails, should be in the <name:id> format.
@@ -0,0 +1,35 @@
+from __future__ import annotations
+
+import numpy as np
+
+def lttb(values: np.ndarray, threshold: int) -> np.ndarray:
+    """Returns the indexes of the points Largest-Triangle-Three-Buckets keeps out of the evenly spaced values.
+
+    The first and the last points are always kept. The points in between are split into threshold - 2 buckets,
+    and each bucket keeps the point forming the largest triangle with the point kept before it and the mean of the
+    next bucket. So peaks and drops survive, where averaging or taking every nth point would flatten or skip them.
+    """
+    count = len(values)
+    if threshold >= count or threshold < 3:
+        return np.arange(count)
+
+    y = values.astype(np.float64)
+    # Bucket i spans edges[i] to edges[i + 1], the last bucket is the last point alone
+    edges = np.append((np.arange(threshold - 1) * ((count - 2) / (threshold - 2))).astype(np.int64) + 1, count)
+
+    kept = np.empty(threshold, dtype=np.int64)
+    kept[0], kept[-1] = 0, count - 1
+    a = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        next_end = edges[i + 2]
+        mean_x = (end + next_end - 1) / 2 # The mean of the indexes of the next bucket
+        mean_y = y[end:next_end].mean()
+
+        # Twice the areas of the triangles, the x of a point is its index
+        xs = np.arange(start, end)
+        areas = np.abs((a - mean_x) * (y[start:end] - y[a]) - (a - xs) * (mean_y - y[a]))
+        a = start + int(np.argmax(areas))
+        kept[i + 1] = a
+
+    return kept
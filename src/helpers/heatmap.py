@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+import asyncio
+import numpy as np
+import time
+
+from datetime import tzinfo
+from typing import Dict, Optional, Tuple, TYPE_CHECKING
+from .chart import ChartData, MINUTE_LABELS, utc_offsets
+
+if TYPE_CHECKING:
+    from bot import QueryBot
+
+WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+HeatmapKey = Tuple[str, int, Optional[str]] # (ip, port, timezone name)
+
+def hour_of_week(hours: np.ndarray, tz: Optional[tzinfo]) -> np.ndarray:
+    """Returns the local hour of the week (0 is Monday 00:00) each of the sorted UTC hours starts in."""
+    local = hours + utc_offsets(hours, tz)
+    # The epoch was on a Thursday
+    return (local // 86400 + 3) % 7 * 24 + local % 86400 // 3600
+
+class Heatmap:
+    """Player and sample totals of a server by the local hour of the week, the averages are their ratio."""
+    def __init__(self) -> None:
+        self.players = np.zeros(168, dtype=np.float64)
+        self.samples = np.zeros(168, dtype=np.int64)
+        self.until = 0 # The hourly rollups before this hour are counted
+        self.lock = asyncio.Lock() # Two updates at once would count the same hours twice
+
+    def add(self, hours: np.ndarray, players: np.ndarray, samples: np.ndarray, tz: Optional[tzinfo]) -> None:
+        cells = hour_of_week(hours, tz)
+        self.players += np.bincount(cells, weights=players, minlength=168)
+        self.samples += np.bincount(cells, weights=samples, minlength=168).astype(np.int64)
+
+    def averages(self) -> np.ndarray:
+        """Returns the average player count of every hour of the week as a 7 x 24 grid, NaN where nothing was recorded."""
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return (self.players / self.samples).reshape(7, 24)
+
+    def chart_data(self) -> ChartData:
+        """Returns the averages as the 168 time points of a heatmap chart, labelled "Monday 00:00" and so on."""
+        labels = np.char.add(np.repeat([f"{day} " for day in WEEKDAYS], 24), np.tile(MINUTE_LABELS[::60], 7))
+        return ChartData(labels, self.averages().ravel(), self.samples)
+
+    def peak(self) -> Optional[Tuple[int, int, float]]:
+        """Returns the weekday, the hour and the average player count of the busiest hour of the week."""
+        if not self.samples.any():
+            return None
+
+        averages = self.averages()
+        weekday, hour = np.unravel_index(np.nanargmax(averages), averages.shape)
+        return int(weekday), int(hour), float(averages[weekday, hour])
+
+class Heatmaps:
+    """The hour of the week heatmaps of the servers, kept up to date from the hourly rollups.
+
+    A heatmap only reads the hours which were completed since it was last asked for, so the history
+    is reduced once and every later request adds a few rows to it.
+    """
+    def __init__(self, bot: QueryBot) -> None:
+        self.bot = bot
+        self.heatmaps: Dict[HeatmapKey, Heatmap] = {}
+
+    async def get(self, ip: str, port: int, timezone: Optional[str], tz: Optional[tzinfo]) -> Heatmap:
+        heatmap = self.heatmaps.setdefault((ip, port, timezone), Heatmap())
+        now = int(time.time())
+        until = now - now % 3600 # The current hour is still being recorded
+        async with heatmap.lock: # The first update of a server reads its whole history, the other servers don't wait for it
+            if heatmap.until >= until:
+                return heatmap
+
+            async with self.bot.pool.acquire() as conn:
+                res = await conn.fetchall(
+                    "SELECT hour, sum_players, samples FROM rollup_hourly WHERE ip = ? AND port = ? AND hour >= ? AND hour < ? ORDER BY hour",
+                    (ip, port, heatmap.until, until)
+                )
+
+            if res:
+                hours, players, samples = np.array(res, dtype=np.int64).T
+                heatmap.add(hours, players, samples, tz)
+            heatmap.until = until
+
+        return heatmap
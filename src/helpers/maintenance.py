@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+import asyncio
+import asqlite
+import datetime
+import time
+
+from discord.ext import tasks
+from itertools import groupby
+from . import config
+from .archive import decode_day, encode_day, merge_day
+from .metrics import DB_LATENCY
+
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from bot import QueryBot
+
+AUTO_VACUUM_INCREMENTAL = 2
+
+class Maintenance:
+    """Archives and prunes the history past its retention and gives the freed pages back to the filesystem once a day.
+
+    Raw samples are already folded into the rollups as they are inserted. Past RAW_RETENTION_DAYS they're packed
+    into one archive blob per server and day, which day charts decode when the series store doesn't have the day.
+    The series store isn't pruned. It runs on its own connection in small batches, each one holding the statistics
+    writer back only for as long as it takes.
+    """
+    def __init__(self, bot: QueryBot, database: str) -> None:
+        self.bot = bot
+        self.database = database
+        self.running = asyncio.Lock()
+
+    def start(self) -> None:
+        self.daily_maintenance.start()
+
+    def stop(self) -> None:
+        self.daily_maintenance.cancel()
+
+    @tasks.loop(time=datetime.time(hour=config.MAINTENANCE_HOUR, tzinfo=datetime.timezone.utc))
+    async def daily_maintenance(self) -> None:
+        try:
+            await self.run()
+        except Exception as exc: # Try again tomorrow
+            self.bot.logger.error("Database maintenance failed.", exc_info=exc)
+
+    async def run(self) -> None:
+        if self.running.locked():
+            return
+
+        async with self.running, asqlite.connect(self.database) as conn:
+            now = int(time.time())
+            before = now - config.RAW_RETENTION_DAYS * 86400
+            before -= before % 86400 # Only whole days are archived
+            raw = await self.archive(conn, before)
+            hourly = await self.prune(conn, "rollup_hourly", "hour", now - config.HOURLY_RETENTION_DAYS * 86400)
+            await self.compact(conn)
+
+        self.bot.logger.info(f"Database maintenance archived {raw} samples and pruned {hourly} hourly rollups.")
+
+    async def archive(self, conn: asqlite.Connection, before: int) -> int:
+        """Moves the raw samples older than before into the archive, one server at a time."""
+        servers = await conn.fetchall("SELECT DISTINCT ip, port FROM dailystats WHERE timestamp < ?", (before,))
+
+        archived = 0
+        for ip, port in servers:
+            res = await conn.fetchall("SELECT timestamp, playercount, online FROM dailystats WHERE ip = ? AND port = ? AND timestamp < ? ORDER BY timestamp", (ip, port, before))
+            days = [(day, [tuple(row) for row in rows]) for day, rows in groupby(res, key=lambda row: row[0] - row[0] % 86400)]
+
+            async with self.bot.writer.lock:
+                with DB_LATENCY.time("archive"):
+                    async with conn.transaction():
+                        for day, samples in days:
+                            existing = await conn.fetchone("SELECT data FROM archive WHERE ip = ? AND port = ? AND day = ?", (ip, port, day))
+                            data = merge_day(existing[0], samples) if existing else encode_day(samples)
+                            count = len(decode_day(data)[0]) if existing else len(samples) # Merged samples of the same epoch count once
+                            await conn.execute("INSERT OR REPLACE INTO archive VALUES (?, ?, ?, ?, ?)", (ip, port, day, count, data))
+                        await conn.execute("DELETE FROM dailystats WHERE ip = ? AND port = ? AND timestamp < ?", (ip, port, before))
+
+            archived += len(res)
+            await asyncio.sleep(config.RETENTION_BATCH_PAUSE) # Let the writer commit what piled up
+
+        return archived
+
+    async def prune(self, conn: asqlite.Connection, table: str, column: str, before: int) -> int:
+        # The tables are WITHOUT ROWID, so the batch is picked by its primary key
+        res = await conn.fetchone(f"SELECT group_concat(name) FROM pragma_table_info('{table}') WHERE pk > 0")
+        key = res[0]
+
+        deleted = 0
+        while True:
+            async with self.bot.writer.lock:
+                with DB_LATENCY.time(f"prune_{table}"):
+                    cursor = await conn.execute(
+                        f"DELETE FROM {table} WHERE ({key}) IN (SELECT {key} FROM {table} WHERE {column} < ? LIMIT ?)",
+                        (before, config.RETENTION_BATCH_SIZE)
+                    )
+
+            count = cursor.get_cursor().rowcount
+            deleted += count
+            if count < config.RETENTION_BATCH_SIZE:
+                return deleted
+
+            await asyncio.sleep(config.RETENTION_BATCH_PAUSE) # Let the writer commit what piled up
+
+    async def compact(self, conn: asqlite.Connection) -> None:
+        res = await conn.fetchone("PRAGMA auto_vacuum")
+        async with self.bot.writer.lock:
+            if res[0] != AUTO_VACUUM_INCREMENTAL:
+                # Switching the mode needs a full VACUUM, after that the free pages can be released incrementally
+                with DB_LATENCY.time("vacuum"):
+                    await conn.execute(f"PRAGMA auto_vacuum = {AUTO_VACUUM_INCREMENTAL}")
+                    await conn.execute("VACUUM")
+                self.bot.logger.info("Rebuilt the database with incremental auto vacuum.")
+            else:
+                with DB_LATENCY.time("incremental_vacuum"):
+                    await conn.execute("PRAGMA incremental_vacuum")
+
+            with DB_LATENCY.time("checkpoint"):
+                await conn.execute("PRAGMA wal_checkpoint(TRUNCATE)") # Keep the WAL from growing to the size of the pruned data
+                await conn.execute("PRAGMA optimize")
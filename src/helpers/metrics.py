@@ -0,0 +1,170 @@
+from __future__ import annotations
+
+import time
+import logging
+
+from aiohttp import web
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+REGISTRY: List[Metric] = []
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Metric:
+    """Base class of the exported metrics. Recording only touches a dict, the text is built when scraped."""
+    type: str = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        REGISTRY.append(self)
+
+    def samples(self) -> Iterator[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        self.values[labels] = self.values.get(labels, 0.0) + amount
+
+    def samples(self) -> Iterator[str]:
+        for labels, value in self.values.items():
+            yield f"{self.name}{_format_labels(self.labelnames, labels)} {value}"
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        self.values[labels] = self.values.get(labels, 0.0) + amount
+
+    def dec(self, *labels: str, amount: float = 1.0) -> None:
+        self.inc(*labels, amount=-amount)
+
+    def set(self, value: float, *labels: str) -> None:
+        self.values[labels] = value
+
+    def samples(self) -> Iterator[str]:
+        for labels, value in self.values.items():
+            yield f"{self.name}{_format_labels(self.labelnames, labels)} {value}"
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+        self.counts: Dict[Tuple[str, ...], List[int]] = {} # Per bucket counts, the last one is +Inf
+        self.sums: Dict[Tuple[str, ...], float] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        try:
+            counts = self.counts[labels]
+        except KeyError:
+            counts = self.counts[labels] = [0] * (len(self.buckets) + 1)
+            self.sums[labels] = 0.0
+
+        counts[bisect_left(self.buckets, value)] += 1
+        self.sums[labels] += value
+
+    @contextmanager
+    def time(self, *labels: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    @contextmanager
+    def track(self, *labels: str) -> Iterator[None]:
+        """Like time but adds an outcome label, either ok or the name of the exception raised."""
+        start = time.perf_counter()
+        outcome = "ok"
+        try:
+            yield
+        except BaseException as exc:
+            outcome = type(exc).__name__
+            raise
+        finally:
+            self.observe(time.perf_counter() - start, *labels, outcome)
+
+    def samples(self) -> Iterator[str]:
+        for labels, counts in self.counts.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                extra = f'le="{le}"'
+                yield f"{self.name}_bucket{_format_labels(self.labelnames, labels, extra)} {cumulative}"
+
+            yield f"{self.name}_sum{_format_labels(self.labelnames, labels)} {self.sums[labels]}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}"
+
+QUERY_LATENCY = Histogram("querybot_query_seconds", "Latency of SA-MP queries.", ("opcode", "outcome"))
+SCHEDULER_LAG = Histogram("querybot_scheduler_lag_seconds", "Delay between the time a job was due and the time it ran.", ("job",))
+JOBS_DUE = Counter("querybot_jobs_due_total", "Number of job iterations scheduled.", ("job",))
+JOBS_RUN = Counter("querybot_jobs_run_total", "Number of job iterations started.", ("job",))
+DB_LATENCY = Histogram("querybot_db_statement_seconds", "Latency of database statements.", ("statement",))
+DISCORD_LATENCY = Histogram("querybot_discord_request_seconds", "Latency of Discord message sends and edits.", ("action",))
+RATE_LIMITS = Counter("querybot_discord_rate_limits_total", "Number of 429 responses received from Discord.")
+CHART_RENDER = Histogram("querybot_chart_render_seconds", "Time taken to render a chart, including the time spent queued.", ("mode",))
+RENDER_QUEUE = Gauge("querybot_chart_render_queue", "Number of chart renders queued or running.")
+WRITER_BATCH = Histogram("querybot_writer_batch_writes", "Number of writes committed together by the statistics writer.", buckets=(1, 5, 10, 50, 100, 500, 1000))
+LOOP_LAG = Histogram("querybot_event_loop_lag_seconds", "Delay of the event loop heartbeat.")
+CACHE_REQUESTS = Counter("querybot_cache_requests_total", "Cache lookups by cache and result.", ("cache", "result"))
+
+def render() -> str:
+    return "\n".join(metric.render() for metric in REGISTRY) + "\n"
+
+class RateLimitCounter(logging.Handler):
+    """Counts the 429 warnings discord.py logs, it doesn't expose them any other way."""
+    def emit(self, record: logging.LogRecord) -> None:
+        if record.levelno >= logging.WARNING and "responded with 429" in record.getMessage():
+            RATE_LIMITS.inc()
+
+class MetricsServer:
+    """Serves the metrics in the Prometheus text format on /metrics."""
+    def __init__(self, host: str, port: int) -> None:
+        self.host = host
+        self.port = port
+        self.runner: Optional[web.AppRunner] = None
+
+    async def handle_metrics(self, request: web.Request) -> web.Response:
+        return web.Response(text=render(), content_type="text/plain", charset="utf-8")
+
+    async def start(self) -> None:
+        app = web.Application()
+        app.router.add_get("/metrics", self.handle_metrics)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, self.host, self.port).start()
+
+    async def close(self) -> None:
+        if self.runner is not None:
+            await self.runner.cleanup()
+            self.runner = None
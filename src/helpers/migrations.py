@@ -0,0 +1,263 @@
+from __future__ import annotations
+
+import pytz
+
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from asqlite import ProxiedConnection
+
+# Every migration runs inside its own transaction and bumps PRAGMA user_version by one when it commits.
+# Never edit a migration that has been released, append a new one instead.
+
+BATCH_SIZE = 10000 # Rows rewritten per batch when a migration has to touch every row of a table
+
+async def _create_tables(conn: ProxiedConnection) -> None:
+    # The schema the bot had before migrations were introduced
+    await conn.execute("""
+        CREATE TABLE IF NOT EXISTS query (
+            guild_id INTEGER NOT NULL,
+            ip CHAR(45),
+            port SMALLINT,
+            interval SMALLINT,
+            channel_id INT,
+            logs INT,
+            message_id INT,
+            timezone CHAR(40),
+            PRIMARY KEY (guild_id)
+        )
+    """)
+    await conn.execute("""
+        CREATE TABLE IF NOT EXISTS stats (
+            ip CHAR(45),
+            port SMALLINT,
+            highest_playercount SMALLINT,
+            peak_hour CHAR(10),
+            PRIMARY KEY (ip, port)
+        )
+    """)
+    await conn.execute("""
+        CREATE TABLE IF NOT EXISTS dailystats (
+            guild_id INT,
+            ip CHAR(45),
+            port SMALLINT,
+            playercount SMALLINT,
+            date DATE,
+            time CHAR(6),
+            status CHAR(8)
+        )
+    """)
+
+def _local_to_timestamp(date: str, time: str, timezone: Optional[str], cache: Dict[Optional[str], Optional[pytz.BaseTzInfo]]) -> Optional[int]:
+    try:
+        naive = datetime.strptime(f"{date} {time}", "%Y-%m-%d %H:%M")
+    except (TypeError, ValueError):
+        return None
+
+    try:
+        tz = cache[timezone]
+    except KeyError:
+        try:
+            tz = cache[timezone] = pytz.timezone(timezone)
+        except pytz.UnknownTimeZoneError: # The sample was taken in the bot's local time
+            tz = cache[timezone] = None
+
+    if tz is None:
+        return int(naive.timestamp())
+    return int(tz.localize(naive).timestamp())
+
+async def _typed_dailystats(conn: ProxiedConnection) -> None:
+    # UTC epoch timestamps instead of local date and time strings, the status as an integer and a primary key.
+    # WITHOUT ROWID makes the primary key the table itself, so a guild's chart is a range scan of it.
+    await conn.execute("""
+        CREATE TABLE dailystats_new (
+            guild_id INTEGER NOT NULL,
+            ip TEXT NOT NULL,
+            port INTEGER NOT NULL,
+            timestamp INTEGER NOT NULL,
+            playercount INTEGER NOT NULL,
+            online INTEGER NOT NULL,
+            PRIMARY KEY (guild_id, ip, port, timestamp)
+        ) WITHOUT ROWID
+    """)
+
+    cache: Dict[Optional[str], Optional[pytz.BaseTzInfo]] = {}
+    async with conn.execute("""
+        SELECT d.guild_id, d.ip, d.port, d.playercount, d.date, d.time, d.status, q.timezone
+        FROM dailystats d LEFT JOIN query q ON q.guild_id = d.guild_id
+    """) as cursor:
+        while True:
+            rows = await cursor.fetchmany(BATCH_SIZE)
+            if not rows:
+                break
+
+            converted = []
+            for guild_id, ip, port, playercount, date, time, status, timezone in rows:
+                timestamp = _local_to_timestamp(date, time, timezone, cache)
+                if timestamp is None or guild_id is None or ip is None or port is None: # Unusable row
+                    continue
+                converted.append((guild_id, ip, int(port), timestamp, playercount or 0, int(status == "online")))
+
+            await conn.executemany("INSERT OR REPLACE INTO dailystats_new VALUES (?, ?, ?, ?, ?, ?)", converted)
+
+    await conn.execute("DROP TABLE dailystats")
+    await conn.execute("ALTER TABLE dailystats_new RENAME TO dailystats")
+    # Covers uptime (online) and windowed lookups of a server regardless of the guild
+    await conn.execute("CREATE INDEX dailystats_server ON dailystats (ip, port, timestamp, online)")
+
+async def _stats_without_rowid(conn: ProxiedConnection) -> None:
+    await conn.execute("""
+        CREATE TABLE stats_new (
+            ip TEXT NOT NULL,
+            port INTEGER NOT NULL,
+            highest_playercount INTEGER,
+            peak_hour TEXT,
+            PRIMARY KEY (ip, port)
+        ) WITHOUT ROWID
+    """)
+    await conn.execute("""
+        INSERT OR IGNORE INTO stats_new
+        SELECT ip, port, highest_playercount, peak_hour FROM stats WHERE ip IS NOT NULL AND port IS NOT NULL
+    """)
+    await conn.execute("DROP TABLE stats")
+    await conn.execute("ALTER TABLE stats_new RENAME TO stats")
+
+# (bucket column, bucket expression of a timestamp) of every rollup table
+ROLLUPS = {
+    "rollup_hourly": ("hour", "{0}timestamp - {0}timestamp % 3600"),
+    "rollup_daily": ("day", "{0}timestamp - {0}timestamp % 86400"),
+    "rollup_monthly": ("month", "CAST(strftime('%s', {0}timestamp, 'unixepoch', 'start of month') AS INTEGER)"),
+}
+
+async def _create_rollup_trigger(conn: ProxiedConnection) -> None:
+    upserts = []
+    for table, (column, bucket) in ROLLUPS.items():
+        upserts.append(f"""
+            INSERT INTO {table} VALUES (NEW.ip, NEW.port, {bucket.format("NEW.")}, NEW.playercount, NEW.playercount, 1, NEW.online)
+            ON CONFLICT (ip, port, {column}) DO UPDATE SET
+                max_players = MAX(max_players, excluded.max_players),
+                sum_players = sum_players + excluded.sum_players,
+                samples = samples + 1,
+                online_samples = online_samples + excluded.online_samples;
+        """)
+
+    await conn.execute(f"""
+        CREATE TRIGGER dailystats_rollup AFTER INSERT ON dailystats
+        BEGIN
+            {"".join(upserts)}
+        END
+    """)
+
+async def _rollups(conn: ProxiedConnection) -> None:
+    # Hourly, daily and monthly aggregates of every server in UTC buckets, kept up to date by a trigger on dailystats.
+    # Charts and uptime read these, so their cost depends on the range asked for instead of the length of the history.
+    for table, (column, bucket) in ROLLUPS.items():
+        await conn.execute(f"""
+            CREATE TABLE {table} (
+                ip TEXT NOT NULL,
+                port INTEGER NOT NULL,
+                {column} INTEGER NOT NULL,
+                max_players INTEGER NOT NULL,
+                sum_players INTEGER NOT NULL,
+                samples INTEGER NOT NULL,
+                online_samples INTEGER NOT NULL,
+                PRIMARY KEY (ip, port, {column})
+            ) WITHOUT ROWID
+        """)
+        await conn.execute(f"""
+            INSERT INTO {table}
+            SELECT ip, port, {bucket.format("")}, MAX(playercount), SUM(playercount), COUNT(*), SUM(online)
+            FROM dailystats GROUP BY 1, 2, 3
+        """)
+
+    await _create_rollup_trigger(conn)
+
+async def _per_server_dailystats(conn: ProxiedConnection) -> None:
+    # Samples are recorded once per server instead of once per guild watching it. Samples the guilds took
+    # at the same second are merged, the rollups are left as they are since their ratios don't change.
+    await conn.execute("""
+        CREATE TABLE dailystats_new (
+            ip TEXT NOT NULL,
+            port INTEGER NOT NULL,
+            timestamp INTEGER NOT NULL,
+            playercount INTEGER NOT NULL,
+            online INTEGER NOT NULL,
+            PRIMARY KEY (ip, port, timestamp)
+        ) WITHOUT ROWID
+    """)
+    await conn.execute("""
+        INSERT INTO dailystats_new
+        SELECT ip, port, timestamp, MAX(playercount), MAX(online) FROM dailystats GROUP BY ip, port, timestamp
+    """)
+    # Dropping the table drops its trigger and index too, the primary key now covers what the index did
+    await conn.execute("DROP TABLE dailystats")
+    await conn.execute("ALTER TABLE dailystats_new RENAME TO dailystats")
+    await _create_rollup_trigger(conn)
+
+async def _aligned_samples(conn: ProxiedConnection) -> None:
+    # Samples are snapped to the start of their hour (the sampling interval when this was written) so every server
+    # shares the same buckets. The first sample of a bucket is kept, the rollups already count every sample.
+    await conn.execute("""
+        CREATE TABLE dailystats_new (
+            ip TEXT NOT NULL,
+            port INTEGER NOT NULL,
+            timestamp INTEGER NOT NULL,
+            playercount INTEGER NOT NULL,
+            online INTEGER NOT NULL,
+            PRIMARY KEY (ip, port, timestamp)
+        ) WITHOUT ROWID
+    """)
+    await conn.execute("""
+        INSERT INTO dailystats_new
+        SELECT ip, port, timestamp - timestamp % 3600, playercount, online FROM dailystats WHERE true ORDER BY ip, port, timestamp
+        ON CONFLICT (ip, port, timestamp) DO NOTHING
+    """)
+    await conn.execute("DROP TABLE dailystats")
+    await conn.execute("ALTER TABLE dailystats_new RENAME TO dailystats")
+    await _create_rollup_trigger(conn)
+
+async def _archive(conn: ProxiedConnection) -> None:
+    # Raw samples past their retention are packed into one blob per server and UTC day (see helpers/archive.py)
+    await conn.execute("""
+        CREATE TABLE archive (
+            ip TEXT NOT NULL,
+            port INTEGER NOT NULL,
+            day INTEGER NOT NULL,
+            samples INTEGER NOT NULL,
+            data BLOB NOT NULL,
+            PRIMARY KEY (ip, port, day)
+        ) WITHOUT ROWID
+    """)
+
+MIGRATIONS: List[Callable[[ProxiedConnection], Awaitable[None]]] = [
+    _create_tables,
+    _typed_dailystats,
+    _stats_without_rowid,
+    _rollups,
+    _per_server_dailystats,
+    _archive,
+    _aligned_samples,
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+async def get_schema_version(conn: ProxiedConnection) -> int:
+    res = await conn.fetchone("PRAGMA user_version")
+    return res[0]
+
+async def migrate(conn: ProxiedConnection) -> List[str]:
+    """Applies the pending migrations in order and returns their names."""
+    version = await get_schema_version(conn)
+    if version > SCHEMA_VERSION:
+        raise RuntimeError(f"The database is at schema version {version} but this version of the bot only knows {SCHEMA_VERSION}.")
+
+    applied = []
+    for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+        async with conn.transaction():
+            await migration(conn)
+            await conn.execute(f"PRAGMA user_version = {number}")
+
+        applied.append(migration.__name__.lstrip("_"))
+
+    return applied
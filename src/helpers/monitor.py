@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+import asyncio
+import heapq
+import inspect
+import sys
+import threading
+import time
+import traceback
+
+from datetime import datetime
+from types import FrameType
+from typing import List, Optional, Tuple
+from .metrics import LOOP_LAG
+
+class Stall:
+    """A stall of the event loop and what was running when it was caught."""
+    def __init__(self, duration: float, coroutine: str, stack: str) -> None:
+        self.duration: float = duration
+        self.coroutine: str = coroutine
+        self.stack: str = stack
+        self.timestamp: datetime = datetime.now()
+
+    def __lt__(self, other: Stall) -> bool:
+        return self.duration < other.duration
+
+def _qualname(frame: FrameType) -> str:
+    return getattr(frame.f_code, "co_qualname", frame.f_code.co_name) # co_qualname was added in 3.11
+
+def describe_frame(frame: FrameType) -> str:
+    """Returns the name of the coroutine step the frame belongs to, or of the function if it's a plain callback."""
+    current: Optional[FrameType] = frame
+    while current is not None:
+        if current.f_code.co_flags & (inspect.CO_COROUTINE | inspect.CO_ITERABLE_COROUTINE):
+            return _qualname(current)
+        current = current.f_back
+
+    return f"callback {_qualname(frame)}"
+
+class LoopMonitor:
+    """Samples the lag of the event loop and keeps the worst stalls it catches.
+
+    A heartbeat is scheduled on the loop every interval. A watchdog thread checks that it keeps firing,
+    and when it's late by more than the threshold, it captures the stack of the loop's thread while it's still stuck.
+    """
+    def __init__(self, interval: float, threshold: float, size: int) -> None:
+        self.interval = interval
+        self.threshold = threshold
+        self.size = size
+        self.worst: List[Stall] = [] # Min-heap, the mildest stall is dropped first once it's full
+        self.max_lag: float = 0.0
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread_id: int = 0
+        self._last_beat: float = 0.0
+        self._pending: Optional[Tuple[float, str, str]] = None # (heartbeat, coroutine, stack) of a stall in progress
+        self._handle: Optional[asyncio.TimerHandle] = None
+        self._stopped = threading.Event()
+        self._watchdog: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._handle = self._loop.call_later(self.interval, self._beat)
+
+        self._stopped.clear()
+        self._watchdog = threading.Thread(target=self._watch, name="loop-monitor", daemon=True)
+        self._watchdog.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+
+    def _beat(self) -> None:
+        assert self._loop
+
+        now = time.monotonic()
+        lag = max(0.0, now - self._last_beat - self.interval)
+        LOOP_LAG.observe(lag)
+        self.max_lag = max(self.max_lag, lag)
+
+        pending, self._pending = self._pending, None
+        if pending is not None and pending[0] == self._last_beat:
+            self.record(Stall(lag, pending[1], pending[2]))
+
+        self._last_beat = now
+        self._handle = self._loop.call_later(self.interval, self._beat)
+
+    def _watch(self) -> None:
+        while not self._stopped.wait(self.threshold / 2):
+            beat = self._last_beat
+            if time.monotonic() - beat - self.interval < self.threshold:
+                continue
+
+            if self._pending is not None and self._pending[0] == beat: # Already captured this stall
+                continue
+
+            frame = sys._current_frames().get(self._thread_id)
+            if frame is None:
+                continue
+
+            coroutine = describe_frame(frame)
+            try:
+                task = asyncio.current_task(self._loop)
+            except RuntimeError:
+                task = None
+
+            if task is not None: # Name the coroutine of the task too, the step may be deep inside it
+                coroutine = f"{getattr(task.get_coro(), '__qualname__', task.get_name())} -> {coroutine}"
+
+            self._pending = (beat, coroutine, "".join(traceback.format_stack(frame)))
+            del frame
+
+    def record(self, stall: Stall) -> None:
+        if len(self.worst) < self.size:
+            heapq.heappush(self.worst, stall)
+        else:
+            heapq.heappushpop(self.worst, stall)
+
+    def dump(self) -> List[Stall]:
+        return sorted(self.worst, reverse=True)
+
+    def clear(self) -> None:
+        self.worst.clear()
+        self.max_lag = 0.0
@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+import heapq
+import time
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional, Tuple
+
+PHASES = ("query", "embed", "db", "discord")
+
+class PhaseTimer:
+    """A class for storing the time spent in each phase of one job iteration."""
+    def __init__(self, job: str, guild_id: Optional[int], server: str) -> None:
+        self.job: str = job
+        self.guild_id: Optional[int] = guild_id # None for the jobs shared by every guild watching the server
+        self.server: str = server
+        self.phases: Dict[str, float] = {}
+        self.total: float = 0.0
+
+    def add(self, phase: str, seconds: float) -> None:
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def __lt__(self, other: PhaseTimer) -> bool:
+        return self.total < other.total
+
+class JobStats:
+    """A class for storing the aggregated timings of the jobs of a guild or a server."""
+    def __init__(self) -> None:
+        self.runs: int = 0
+        self.total: float = 0.0
+        self.worst: float = 0.0
+        self.phases: Dict[str, float] = {}
+
+    def add(self, timer: PhaseTimer) -> None:
+        self.runs += 1
+        self.total += timer.total
+        self.worst = max(self.worst, timer.total)
+        for phase, seconds in timer.phases.items():
+            self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.runs if self.runs else 0.0
+
+_current: ContextVar[Optional[PhaseTimer]] = ContextVar("current_phase_timer", default=None)
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    """Times a phase of the job running in the current task, does nothing outside of a job."""
+    timer = _current.get()
+    if timer is None:
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timer.add(name, time.perf_counter() - start)
+
+class Perf:
+    """Aggregates the phase timings of the status and stats jobs per guild and per server."""
+    def __init__(self, size: int = 20) -> None:
+        self.size = size
+        self.guilds: Dict[int, JobStats] = {}
+        self.servers: Dict[str, JobStats] = {}
+        self.slowest: List[PhaseTimer] = [] # Min-heap of the slowest iterations
+
+    @contextmanager
+    def job(self, job: str, guild_id: Optional[int], ip: str, port: int) -> Iterator[PhaseTimer]:
+        timer = PhaseTimer(job, guild_id, f"{ip}:{port}")
+        token = _current.set(timer)
+        start = time.perf_counter()
+        try:
+            yield timer
+        finally:
+            timer.total = time.perf_counter() - start
+            _current.reset(token)
+            self.record(timer)
+
+    def record(self, timer: PhaseTimer) -> None:
+        if timer.guild_id is not None:
+            self.guilds.setdefault(timer.guild_id, JobStats()).add(timer)
+        self.servers.setdefault(timer.server, JobStats()).add(timer)
+
+        if len(self.slowest) < self.size:
+            heapq.heappush(self.slowest, timer)
+        else:
+            heapq.heappushpop(self.slowest, timer)
+
+    def top_guilds(self, n: int) -> List[Tuple[int, JobStats]]:
+        return heapq.nlargest(n, self.guilds.items(), key=lambda item: item[1].mean)
+
+    def top_servers(self, n: int) -> List[Tuple[str, JobStats]]:
+        return heapq.nlargest(n, self.servers.items(), key=lambda item: item[1].mean)
+
+    def slowest_jobs(self, n: int) -> List[PhaseTimer]:
+        return sorted(self.slowest, reverse=True)[:n]
+
+    def clear(self) -> None:
+        self.guilds.clear()
+        self.servers.clear()
+        self.slowest.clear()
+
+def format_phases(phases: Dict[str, float]) -> str:
+    return " ".join(f"{name}={phases[name] * 1000:.0f}ms" for name in PHASES if name in phases)
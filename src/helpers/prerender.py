@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+import asyncio
+
+from collections import Counter
+from datetime import datetime, timedelta
+from discord.ext import tasks
+from . import config
+from . import utils as _utils
+from .chart import ChartData, Mode
+
+from typing import Dict, Optional, Tuple, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from bot import QueryBot
+
+SETTLE_DELAY = config.RECENT_FLUSH_RESOLUTION + config.STATS_MAX_INTERVAL # Seconds after midnight until the samples of the day are all stored
+
+ChartSource = Tuple[str, int, Optional[str]] # (ip, port, timezone name) the charts of a guild are made from
+
+class Prerenderer:
+    """Renders the charts which won't change anymore into the chart cache before anybody asks for them.
+
+    The day charts of a server are rendered once the day ends in the guild's timezone, the month chart once the
+    month ends. The most requested charts of the current month are rendered again every run, a run only renders
+    the ones whose data changed since their cache keys are made from it. Renders go one at a time and wait for
+    the interactive ones, so requests never queue behind them.
+    """
+    def __init__(self, bot: QueryBot) -> None:
+        self.bot = bot
+        self.requests: Counter[ChartSource] = Counter() # Month charts asked for, halved every run so it follows what's popular now
+        self.rendered_days: Dict[ChartSource, str] = {} # Last day whose chart was rendered
+        self.rendered_months: Dict[ChartSource, int] = {} # Last month whose chart was rendered
+
+    def start(self) -> None:
+        if config.PRERENDER_INTERVAL is not None:
+            self.prerender.change_interval(minutes=config.PRERENDER_INTERVAL)
+            self.prerender.start()
+
+    def stop(self) -> None:
+        self.prerender.cancel()
+
+    def requested(self, ip: str, port: int, timezone: Optional[str]) -> None:
+        self.requests[(ip, port, timezone)] += 1
+
+    @tasks.loop(minutes=10)
+    async def prerender(self) -> None:
+        try:
+            await self.run()
+        except Exception as exc: # Try again the next run
+            self.bot.logger.error("Pre-rendering charts failed.", exc_info=exc)
+
+    @prerender.before_loop
+    async def before_prerender(self) -> None:
+        await self.bot.wait_until_ready()
+
+    async def run(self) -> None:
+        async with self.bot.pool.acquire() as conn:
+            res = await conn.fetchall("SELECT DISTINCT ip, port, timezone FROM query WHERE ip IS NOT NULL AND port IS NOT NULL")
+
+        now = datetime.now()
+        for ip, port, timezone in res:
+            source = (ip, int(port), timezone)
+            tz = _utils.get_timezone(timezone)
+
+            # The last sample of a day reaches the history at the first poll after midnight at the latest, and its
+            # bucket of the series store once that poll flushes it, so a day only counts as closed after both
+            local = datetime.now(tz) - timedelta(seconds=SETTLE_DELAY)
+            yesterday = (local - timedelta(days=1)).strftime("%Y-%m-%d")
+            if self.rendered_days.get(source) != yesterday:
+                data = await self.bot.chart.fetch_day(*source[:2], tz, yesterday)
+                if self.bot.chart.can_chart_be_made(data):
+                    await self.render(yesterday, data, Mode.MODE_DAY)
+                self.rendered_days[source] = yesterday
+
+            # Months are asked for by their name in the current year, so January has no finished month to render
+            if local.year == now.year and local.month > 1 and self.rendered_months.get(source) != local.month - 1:
+                await self.render_month(source, local.year, local.month - 1)
+                self.rendered_months[source] = local.month - 1
+
+        for source, _ in self.requests.most_common(config.PRERENDER_WARM_CHARTS):
+            await self.render_month(source, now.year, now.month)
+
+        for source in list(self.requests):
+            self.requests[source] //= 2
+            if not self.requests[source]:
+                del self.requests[source]
+
+    async def render_month(self, source: ChartSource, year: int, month: int) -> None:
+        ip, port, timezone = source
+        data = await self.bot.chart.fetch_month(ip, port, _utils.get_timezone(timezone), year, month)
+        if self.bot.chart.can_chart_be_made(data):
+            await self.render(_utils.MONTHS[month - 1], data, Mode.MODE_MONTH)
+
+    async def render(self, header: str, data: ChartData, mode: Mode) -> None:
+        while self.bot.chart.queued: # Somebody is waiting for a chart
+            await asyncio.sleep(config.PRERENDER_PAUSE)
+
+        await self.bot.chart.chart_image(header, data, mode)
+        await asyncio.sleep(config.PRERENDER_PAUSE)
@@ -9,6 +9,7 @@ import struct
 from typing import Optional, TYPE_CHECKING
 from ._types import ServerData
 from .errors import ServerOffline
+from .metrics import QUERY_LATENCY
 
 if TYPE_CHECKING:
     from bot import QueryBot
@@ -20,7 +21,8 @@ class Query:
         self.bot = bot
 
     async def send_rcon_command(self, client: Client, command: str) -> str:
-        response = await trio_asyncio.trio_as_aio(client.rcon)(command) # type: ignore
+        with QUERY_LATENCY.track("rcon"):
+            response = await trio_asyncio.trio_as_aio(client.rcon)(command) # type: ignore
         return response
 
     async def _connect(self, host: str, port: int, *, rcon_password: Optional[str] = None, retry: Optional[bool] = True) -> Client:
@@ -30,7 +32,7 @@ class Query:
 
         while (tries < 3): # Retrying thrice
             try:
-                with trio.fail_after(TIMEOUT):
+                with QUERY_LATENCY.track("ping"), trio.fail_after(TIMEOUT):
                     ping = await client.ping()
 
             except (trio.TooSlowError, ConnectionRefusedError, ConnectionResetError):
@@ -54,14 +56,15 @@ class Query:
         client = await self.connect(host, port, rcon_password=None, retry=retry)
 
         try:
-            with trio.fail_after(TIMEOUT): 
+            with QUERY_LATENCY.track("info"), trio.fail_after(TIMEOUT): 
                 info = await client.info()
         except trio.TooSlowError: # We didn't receive info from the server, there is nothing to send so raise ServerOffline
             raise ServerOffline(host, port)
         
-        rules = await client.rules()
+        with QUERY_LATENCY.track("rules"):
+            rules = await client.rules()
         try:
-            with trio.fail_after(TIMEOUT):
+            with QUERY_LATENCY.track("players"), trio.fail_after(TIMEOUT):
                 players = await client.players()
         except (trio.TooSlowError, struct.error): # error while unpacking player data received from the server
             players = None
@@ -83,7 +86,8 @@ class Query:
     
     async def _get_server_info(self, host: str, port: int, *, retry: bool = True) -> ServerInfo: # This is different from get_server_data as this only requests for info
         client = await self.connect(host, port, retry=retry)
-        info = await client.info()
+        with QUERY_LATENCY.track("info"):
+            info = await client.info()
 
         if client._socket: 
             client._socket.close() 
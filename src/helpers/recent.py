@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+import numpy as np
+
+from typing import Dict, Hashable, List, Tuple
+
+class RecentActivity:
+    """Per-minute player counts of the last hours of every server, kept in fixed-size ring buffers.
+
+    A slot holds the minute it was written in, so stale slots are told apart from fresh ones without clearing them.
+    """
+    def __init__(self, hours: int) -> None:
+        self.size = hours * 60
+        self.minutes: Dict[Hashable, np.ndarray] = {}
+        self.players: Dict[Hashable, np.ndarray] = {}
+        self.online: Dict[Hashable, np.ndarray] = {}
+        self.flushed: Dict[Hashable, int] = {} # Epoch up to which the samples were flushed
+
+    def record(self, server: Hashable, epoch: int, players: int, online: bool) -> None:
+        try:
+            minutes = self.minutes[server]
+        except KeyError:
+            minutes = self.minutes[server] = np.full(self.size, -1, dtype=np.int64)
+            self.players[server] = np.zeros(self.size, dtype=np.uint16)
+            self.online[server] = np.zeros(self.size, dtype=np.uint8)
+
+        minute = epoch // 60
+        slot = minute % self.size
+        minutes[slot] = minute
+        self.players[server][slot] = players
+        self.online[server][slot] = online
+
+    def window(self, server: Hashable, start: int, end: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Returns the epochs, player counts and online flags recorded from start to end, sorted by epoch."""
+        try:
+            minutes = self.minutes[server]
+        except KeyError:
+            empty = np.empty(0, dtype=np.int64)
+            return empty, empty, empty
+
+        epochs = minutes * 60 # Samples are filed under the start of their minute
+        indexes = np.flatnonzero((minutes >= 0) & (epochs >= start) & (epochs < end))
+        indexes = indexes[np.argsort(epochs[indexes])]
+        return epochs[indexes], self.players[server][indexes].astype(np.int64), self.online[server][indexes].astype(np.int64)
+
+    def take_flush(self, server: Hashable, now: int, resolution: int) -> List[Tuple[int, int, int]]:
+        """Returns the (epoch, peak players, online) samples of the complete buckets that weren't flushed yet."""
+        end = now - now % resolution
+        start = self.flushed.get(server, 0)
+        if end <= start:
+            return []
+
+        epochs, players, online = self.window(server, start, end)
+        self.flushed[server] = end
+        if not len(epochs):
+            return []
+
+        buckets, index = np.unique(epochs - epochs % resolution, return_inverse=True)
+        peaks = np.zeros(len(buckets), dtype=np.int64)
+        np.maximum.at(peaks, index, players)
+        flags = np.zeros(len(buckets), dtype=np.int64)
+        np.maximum.at(flags, index, online)
+        return list(zip(buckets.tolist(), peaks.tolist(), flags.tolist()))
+
+    def forget(self, server: Hashable) -> None:
+        for buffers in (self.minutes, self.players, self.online, self.flushed):
+            buffers.pop(server, None)
@@ -0,0 +1,159 @@
+from __future__ import annotations
+
+import io
+import numpy as np
+
+from enum import Enum
+from typing import List, Optional
+from .errors import ChartNotFound
+from .downsample import lttb
+
+# Spawned chart processes import this module to unpickle their work, so it only imports NumPy, and Matplotlib once they draw
+
+# Modes for chart making
+class Mode(Enum):
+    MODE_MONTH = 1
+    MODE_DAY = 2
+    MODE_RECENT = 3
+    MODE_SPARKLINE = 4 # Quick views drawn with Pillow on the spot, without axes or labels
+    MODE_BARS = 5
+    MODE_RANGE = 6 # Weeks, quarters, years and custom spans of days
+    MODE_HEATMAP = 7 # Average players by the hour of the week, 168 time points from Monday 00:00
+
+MAX_CHART_WIDTH = 30 # Inches, charts of many time points are squeezed into it
+MAX_LABELLED_POINTS = 48 # Time points past which only some of them are labelled and marked
+
+class ChartData:
+    """The time points of a chart in order: their labels and the player count at each.
+
+    Month charts have a point per day labelled %Y-%m-%d with the highest player count of the day, and the
+    number of samples recorded in that day. Day charts have a point per sample labelled %H:%M.
+    """
+    def __init__(self, labels: Optional[np.ndarray] = None, players: Optional[np.ndarray] = None, samples: Optional[np.ndarray] = None) -> None:
+        self.labels: np.ndarray = labels if labels is not None else np.empty(0, dtype=str)
+        self.players: np.ndarray = players if players is not None else np.empty(0, dtype=np.int64)
+        self.samples: np.ndarray = samples if samples is not None else np.ones(len(self.labels), dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+    def downsample(self, points: int) -> ChartData:
+        """Returns the chart with at most that many time points, picked so that the peaks and drops stay visible."""
+        if len(self) <= points:
+            return self
+
+        kept = lttb(self.players, points)
+        return ChartData(self.labels[kept], self.players[kept], self.samples[kept])
+
+    @property
+    def max_playercount(self) -> int:
+        return int(self.players.max()) if len(self.players) else 0
+
+def round_to_lowest_hundred(num: int) -> int: # Used for chart y tick increment
+    num -= num % 100
+    return num
+
+def get_y_ticks(num: List[int]) -> range:
+    if max(num) <= 5:
+        return range(0, 6, 1)
+    
+    if max(num) <= 10:
+        return range(0, 11, 2)
+    
+    if max(num) <= 50:
+        return range(0, 51, 5)
+    
+    # Y ticks if the max playercount is bigger than 100
+
+    if max(num) >= 100:
+        return range(0, max(num) + 1, round_to_lowest_hundred(max(num)) // 10)
+    
+    return range(0, max(num) + 10, 10) # > 10 and < 100
+
+def render_chart(header: str, data: ChartData, mode: Mode) -> bytes:
+    """Draws the chart and returns it as a PNG. Runs in the chart processes.
+
+    Every call draws on its own Figure and canvas instead of the pyplot global state,
+    so nothing is shared between renders and the figure is freed once it's saved.
+    """
+    # Only the chart processes import Matplotlib, the bot never needs it
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    if not len(data):
+        raise ChartNotFound(f"Data for {header} wasn't found.")
+
+    if mode == Mode.MODE_HEATMAP:
+        return render_heatmap(header, data)
+
+    player_counts = data.players.tolist()
+    if mode == Mode.MODE_MONTH:
+        x_axis = [f"{day[8:]}-{day[5:7]}" for day in data.labels.tolist()] # Remove the year and put it in the format of DD-MM
+        x_label = "Dates"
+        title = f"Server Player Count On {header}"
+    else:
+        x_axis = data.labels.tolist()
+        x_label = "Time Points"
+
+        if mode == Mode.MODE_RECENT:
+            title = f"Server Player Count In The {header}"
+        elif mode == Mode.MODE_RANGE:
+            if len(x_axis[0]) == 10: # A point per day, %Y-%m-%d
+                x_axis = [f"{day[8:]}-{day[5:7]}-{day[:4]}" for day in x_axis]
+                x_label = "Dates"
+            title = f"Server Player Count From {header}"
+        else: # After getting the data, format the date
+            title = f"Server Player Count On {'-'.join(header.split('-')[::-1])}"
+
+    dense = len(x_axis) > MAX_LABELLED_POINTS
+    figure = Figure(figsize=(min(len(x_axis) / 2 + 5, MAX_CHART_WIDTH), 7))
+    FigureCanvasAgg(figure)
+    ax = figure.add_subplot()
+    # Plotted by position, as categories the time points sharing a label (DST, downsampled ranges) would be merged
+    ax.plot(range(len(x_axis)), player_counts, marker='' if dense else 'o', linestyle='-', color='tab:blue', markersize=8, linewidth=2)
+    if dense: # Label every few points only so the labels don't overlap
+        step = -(-len(x_axis) // MAX_LABELLED_POINTS)
+        ax.set_xticks(range(0, len(x_axis), step), x_axis[::step], rotation=45)
+    else:
+        ax.set_xticks(range(len(x_axis)), x_axis)
+    ax.set_yticks(get_y_ticks(player_counts))
+    ax.grid(True, linestyle='--', alpha=0.7)
+    ax.set_title(title, fontsize=16)
+    ax.set_xlabel(x_label, fontsize=14, fontweight='bold', color='darkslategray')
+    ax.set_ylabel('Player Count', fontsize=14, fontweight='bold', color='darkslategray')
+    ax.legend(['Player Count'], loc='upper right')
+
+    # Adjust layout to prevent clipping of labels
+    figure.tight_layout()
+
+    # Saved in memory, concurrent renders of a guild would race on a shared file
+    buffer = io.BytesIO()
+    figure.savefig(buffer, format="png")
+
+    return buffer.getvalue()
+
+def render_heatmap(header: str, data: ChartData) -> bytes:
+    """Draws the averages of the hours of the week as a weekday by hour grid. Runs in the chart processes."""
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    averages = data.players.reshape(7, 24)
+    figure = Figure(figsize=(16, 6))
+    FigureCanvasAgg(figure)
+    ax = figure.add_subplot()
+    image = ax.imshow(np.ma.masked_invalid(averages), cmap="Blues", aspect="auto")
+    ax.set_xticks(range(24), [label.split(" ")[1] for label in data.labels[:24].tolist()], rotation=45)
+    ax.set_yticks(range(7), [label.split(" ")[0] for label in data.labels[::24].tolist()])
+    for (weekday, hour), average in np.ndenumerate(averages):
+        if not np.isnan(average): # Light text on the dark cells
+            ax.text(hour, weekday, f"{average:.0f}", ha="center", va="center", fontsize=8, color="white" if average > np.nanmax(averages) * 0.6 else "black")
+    figure.colorbar(image, ax=ax, label="Average Player Count")
+    ax.set_title(f"Average Player Count By The Hour Of The Week ({header})", fontsize=16)
+    ax.set_xlabel("Hour", fontsize=14, fontweight='bold', color='darkslategray')
+    ax.set_ylabel("Day", fontsize=14, fontweight='bold', color='darkslategray')
+    figure.tight_layout()
+
+    buffer = io.BytesIO()
+    figure.savefig(buffer, format="png")
+
+    return buffer.getvalue()
@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+import numpy as np
+import os
+
+from typing import Dict, Iterable, Tuple, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from asqlite import Pool
+
+# One sample of a server, packed so a file is a plain array of them
+RECORD = np.dtype([("epoch", "<u4"), ("players", "<u2"), ("online", "u1")])
+
+EMPTY = np.empty(0, dtype=RECORD)
+
+class SeriesStore:
+    """Append-only files of fixed-width samples, one per server, read back as memory-mapped NumPy arrays.
+
+    The samples of a file are sorted by their epoch, so any time range is two binary searches away.
+    It's kept alongside dailystats, which the rollups are built from.
+    """
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+        self.last_epoch: Dict[str, int] = {} # Epoch of the last sample of each file, older samples are dropped
+
+    def exists(self) -> bool:
+        return os.path.isdir(self.directory)
+
+    def path(self, ip: str, port: int) -> str:
+        return os.path.join(self.directory, f"{ip.replace(':', '_')}-{port}.bin") # IPv6 addresses can't be file names as they are
+
+    def _last_epoch(self, path: str) -> int:
+        try:
+            return self.last_epoch[path]
+        except KeyError:
+            pass
+
+        last = -1
+        try:
+            with open(path, "r+b") as file:
+                size = os.fstat(file.fileno()).st_size
+                whole = size - size % RECORD.itemsize
+                if whole != size: # A write cut short by a crash, the partial record is dropped
+                    file.truncate(whole)
+                if whole:
+                    file.seek(whole - RECORD.itemsize)
+                    last = int(np.frombuffer(file.read(RECORD.itemsize), dtype=RECORD)["epoch"][0])
+        except FileNotFoundError:
+            pass
+
+        self.last_epoch[path] = last
+        return last
+
+    def append(self, ip: str, port: int, samples: Iterable[Tuple[int, int, int]]) -> int:
+        """Appends (epoch, players, online) samples of the server and returns how many were written."""
+        path = self.path(ip, port)
+        last = self._last_epoch(path)
+
+        records = np.array([sample for sample in samples if sample[0] > last], dtype=RECORD)
+        if not len(records):
+            return 0
+
+        records.sort(order="epoch")
+        os.makedirs(self.directory, exist_ok=True)
+        with open(path, "ab") as file:
+            file.write(records.tobytes())
+
+        self.last_epoch[path] = int(records["epoch"][-1])
+        return len(records)
+
+    def read(self, ip: str, port: int, start: int, end: int) -> np.ndarray:
+        """Returns a copy of the samples of the server from start (inclusive) to end (exclusive)."""
+        path = self.path(ip, port)
+        if self._last_epoch(path) < 0: # Missing or empty, the first access also drops a partial record
+            return EMPTY
+
+        series = np.memmap(path, dtype=RECORD, mode="r")
+
+        lo, hi = np.searchsorted(series["epoch"], (start, end))
+        return np.array(series[lo:hi])
+
+    async def import_dailystats(self, pool: Pool) -> int:
+        """Fills the store with the samples already in dailystats, returns how many were imported."""
+        imported = 0
+        async with pool.acquire() as conn:
+            servers = await conn.fetchall("SELECT DISTINCT ip, port FROM dailystats")
+            for ip, port in servers:
+                res = await conn.fetchall("SELECT timestamp, playercount, online FROM dailystats WHERE ip = ? AND port = ? ORDER BY timestamp", (ip, port))
+                imported += self.append(ip, port, [tuple(row) for row in res])
+
+        return imported
@@ -0,0 +1,59 @@
+from __future__ import annotations
+
+import io
+import numpy as np
+
+from PIL import Image, ImageDraw
+from .downsample import lttb
+
+# Compact charts drawn with Pillow alone, small enough to sit in an embed and quick enough to draw on the request path
+SPARKLINE_WIDTH = 400
+SPARKLINE_HEIGHT = 80
+PADDING = 4 # Pixels kept free around the drawing so the line isn't clipped at the edges
+MIN_BAR_WIDTH = 3 # Pixels, more values than fit are downsampled, as are lines with more values than pixels
+
+LINE_COLOR = (31, 119, 180, 255) # Matplotlib's tab:blue, as in the full charts
+FILL_COLOR = (31, 119, 180, 70)
+PEAK_COLOR = (214, 39, 40, 255)
+
+def render_sparkline(players: np.ndarray, *, bars: bool = False, width: int = SPARKLINE_WIDTH, height: int = SPARKLINE_HEIGHT) -> bytes:
+    """Draws the player counts as a line with the area under it filled, or as bars, and returns it as a PNG.
+
+    There are no axes or labels, the highest point is marked instead. The background is transparent so it
+    fits both Discord themes.
+    """
+    players = players[lttb(players, (width - 2 * PADDING) // (MIN_BAR_WIDTH if bars else 1))]
+
+    image = Image.new("RGBA", (width, height), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(image, "RGBA")
+
+    count = len(players)
+    peak = int(players.max()) if count else 0
+    bottom = height - 1 - PADDING
+    # The counts scaled to the height, an empty server is a flat line at the bottom
+    ys = bottom - players.astype(np.float64) * (bottom - PADDING) / max(peak, 1)
+
+    if bars:
+        slot = (width - 2 * PADDING) / max(count, 1)
+        gap = 1 if slot >= 3 else 0
+        for i, y in enumerate(ys.tolist()):
+            left = PADDING + i * slot
+            draw.rectangle((left, min(y, bottom - 1), max(left, left + slot - 1 - gap), bottom), fill=LINE_COLOR)
+        highest = int(np.argmax(players)) if count else 0
+        peak_point = (PADDING + (highest + 0.5) * slot, float(ys[highest]) if count else bottom)
+    else:
+        xs = PADDING + np.arange(count) * (width - 1 - 2 * PADDING) / max(count - 1, 1)
+        points = list(zip(xs.tolist(), ys.tolist()))
+        if count > 1:
+            draw.polygon([(xs[0], bottom), *points, (xs[-1], bottom)], fill=FILL_COLOR)
+            draw.line(points, fill=LINE_COLOR, width=2, joint="curve")
+        highest = int(np.argmax(players)) if count else 0
+        peak_point = points[highest] if count else (PADDING, bottom)
+
+    if peak:
+        x, y = peak_point
+        draw.ellipse((x - 3, y - 3, x + 3, y + 3), fill=PEAK_COLOR)
+
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG", compress_level=1) # The images are tiny, compressing harder only costs time
+    return buffer.getvalue()
@@ -0,0 +1,97 @@
+from __future__ import annotations
+
+import importlib.abc
+import sys
+import time
+
+from contextlib import contextmanager
+from importlib.machinery import ModuleSpec
+from types import ModuleType
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+class _TimedLoader(importlib.abc.Loader):
+    """Wraps the loader of a module to time its execution."""
+    def __init__(self, loader: importlib.abc.Loader, timings: StartupTimings) -> None:
+        self.loader = loader
+        self.timings = timings
+
+    def __getattr__(self, name: str):
+        return getattr(self.loader, name) # get_data, get_resource_reader and the like
+
+    def create_module(self, spec: ModuleSpec) -> Optional[ModuleType]:
+        return self.loader.create_module(spec)
+
+    def exec_module(self, module: ModuleType) -> None:
+        self.timings.children.append(0.0)
+        start = time.perf_counter()
+        try:
+            self.loader.exec_module(module) # type: ignore
+        finally:
+            elapsed = time.perf_counter() - start
+            nested = self.timings.children.pop()
+            package = module.__name__.partition(".")[0]
+            self.timings.imports[package] = self.timings.imports.get(package, 0.0) + elapsed - nested
+            if self.timings.children:
+                self.timings.children[-1] += elapsed
+
+class _TimingFinder(importlib.abc.MetaPathFinder):
+    """Finds modules through the rest of sys.meta_path and hands out timed loaders for them."""
+    def __init__(self, timings: StartupTimings) -> None:
+        self.timings = timings
+
+    def find_spec(self, fullname: str, path: Optional[Sequence[str]], target: Optional[ModuleType] = None) -> Optional[ModuleSpec]:
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is not None:
+                if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+                    spec.loader = _TimedLoader(spec.loader, self.timings) # type: ignore
+                return spec
+
+        return None
+
+class StartupTimings:
+    """Where the time between the start of the process and the bot being ready went.
+
+    Imports are timed per top-level package, each one without the packages it imported itself. Only
+    the imports which happen after start are seen, so it has to be started before anything else is imported.
+    """
+    def __init__(self) -> None:
+        self.started = time.perf_counter()
+        self.imports: Dict[str, float] = {} # Seconds spent executing the modules of each top-level package
+        self.children: List[float] = [] # Seconds spent in nested imports, one entry per import in progress
+        self.phases: List[Tuple[str, float]] = []
+        self.finder: Optional[_TimingFinder] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.finder is not None
+
+    def start(self) -> None:
+        self.started = time.perf_counter()
+        self.finder = _TimingFinder(self)
+        sys.meta_path.insert(0, self.finder)
+
+    def stop(self) -> None:
+        if self.finder is not None:
+            sys.meta_path.remove(self.finder)
+            self.finder = None
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name, time.perf_counter() - start))
+
+    def report(self, top: int = 10) -> str:
+        total = time.perf_counter() - self.started
+        imports = sorted(self.imports.items(), key=lambda item: item[1], reverse=True)
+        lines = [f"Ready {total * 1000:.0f}ms after the start, {sum(self.imports.values()) * 1000:.0f}ms of it importing."]
+        lines.append("Imports: " + " ".join(f"{package}={seconds * 1000:.0f}ms" for package, seconds in imports[:top]))
+        lines.append("Setup: " + " ".join(f"{name}={seconds * 1000:.0f}ms" for name, seconds in self.phases))
+        return "\n".join(lines)
+
+timings = StartupTimings()
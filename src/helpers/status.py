@@ -4,14 +4,18 @@ import discord
 from discord.ext import tasks
 
 import traceback
-import pytz
+import time
 
 from helpers import utils as _utils
+from . import config
+from .cadence import Cadence
+from .recent import RecentActivity
+from .perf import Perf, phase
+from .metrics import SCHEDULER_LAG, JOBS_DUE, JOBS_RUN, DB_LATENCY, DISCORD_LATENCY, CACHE_REQUESTS
 from .query import ServerOffline
-from datetime import datetime
 from .errors import StatusChannelNotFound
 
-from typing import Dict, Union, Optional, TYPE_CHECKING
+from typing import Dict, Hashable, Set, Tuple, Union, Optional, TYPE_CHECKING
 from ._types import ServerData
 
 if TYPE_CHECKING:
@@ -20,7 +24,14 @@ if TYPE_CHECKING:
     from sqlite3 import Row
     from samp_query import ServerInfo
 
-DAILY_STATS_INTERVAL = 60 # The interval at which to get the daily stats of the server (in minutes)
+Server = Tuple[str, int]
+
+DAILY_STATS_INTERVAL = 60 # The interval at which to get the daily stats of the server (in minutes), samples are aligned to it on the clock
+
+def get_sample_bucket() -> int:
+    """Returns the start of the current sampling bucket, aligned on the clock so every server shares them."""
+    now = int(time.time())
+    return now - now % (DAILY_STATS_INTERVAL * 60)
 
 class Status:
     def __init__(self, bot):
@@ -30,9 +41,15 @@ class Status:
 
         self.status_messages: Dict[int, discord.Message] = {} 
         self.guild_status_tasks: Dict[int, tasks.Loop] = {}
-        self.update_stats_tasks: Dict[int, tasks.Loop] = {}
-        self.last_dailystats_update: Dict[int, datetime] = {}
+        self.update_stats_tasks: Dict[Server, tasks.Loop] = {} # Statistics are sampled per server, not per guild
+        self.stats_watchers: Dict[Server, Set[int]] = {} # Guilds watching each sampled server
+        self.guild_servers: Dict[int, Server] = {} # Server watched by each guild
+        self.last_dailystats_update: Dict[Server, int] = {} # Bucket of the last sample of each server
         self._resend_next_iter: Dict[int, bool] = {} 
+        self.cadence: Cadence = Cadence()
+        self.next_due: Dict[Hashable, float] = {} # When the next iteration of each job is expected to run (epoch)
+        self.perf: Perf = Perf()
+        self.recent: RecentActivity = RecentActivity(config.RECENT_HOURS)
 
     def get_status_channel(self, guild_id: int, channel_id: int) -> discord.TextChannel:
         channel = self.bot.get_channel(channel_id)
@@ -46,17 +63,20 @@ class Status:
     async def get_status_message(self, guild_id: int, channel_id: int) -> Optional[Union[discord.Message, discord.PartialMessage]]:
         try:
             if self.status_messages[guild_id] is not None and isinstance(self.status_messages[guild_id], discord.Message):
+                CACHE_REQUESTS.inc("status_message", "hit")
                 return self.status_messages[guild_id]
         except KeyError:
             pass
-                
+
+        CACHE_REQUESTS.inc("status_message", "miss")
         channel = self.get_status_channel(guild_id, channel_id)
 
         if not channel:
             raise StatusChannelNotFound(guild_id)
 
         async with self.bot.pool.acquire() as conn:
-            res = await conn.fetchone("SELECT message_id FROM query WHERE guild_id = ?", (guild_id,))
+            with DB_LATENCY.time("select_message_id"), phase("db"):
+                res = await conn.fetchone("SELECT message_id FROM query WHERE guild_id = ?", (guild_id,))
 
         if not res[0]:
             return None
@@ -69,36 +89,72 @@ class Status:
             await self.status_messages[channel.guild.id].delete() # type: ignore
         except Exception:
             pass
-        message = await channel.send(*args, **kwargs)
+        with DISCORD_LATENCY.time("send"), phase("discord"):
+            message = await channel.send(*args, **kwargs)
         self.status_messages[channel.guild.id] = message
 
         async with self.bot.pool.acquire() as conn:
-            await conn.execute("UPDATE query SET message_id = ? WHERE guild_id = ?", (message.id, channel.guild.id,))
-            await conn.commit()
+            with DB_LATENCY.time("update_message_id"), phase("db"):
+                await conn.execute("UPDATE query SET message_id = ? WHERE guild_id = ?", (message.id, channel.guild.id,))
+                await conn.commit()
 
         return message
 
     async def start_global_stats_update(self) -> None:
         try:
             async with self.bot.pool.acquire() as conn:
-                res = await conn.fetchall("SELECT guild_id, ip, port, timezone FROM query")
+                res = await conn.fetchall("SELECT guild_id, ip, port FROM query")
         except Exception as exc: # Database isn't properly set up, most likely
             self.bot.logger.error("Exception occured in update_stats", exc_info=exc)
             return 
         
         for guild_data in res:
-            guild_id, ip, port, timezone = guild_data[0], guild_data[1], guild_data[2], guild_data[3]
+            guild_id, ip, port = guild_data[0], guild_data[1], guild_data[2]
 
-            if ip is None and port is None and timezone is None:
+            if ip is None or port is None: # The timezone is only applied when the samples are read
                 continue
 
-            @tasks.loop(seconds=60.0, reconnect=True)
-            async def update_stats(guild_id, ip, port):
+            self.watch_server(guild_id, ip, int(port))
+
+    async def start_stats_update_with_guild(self, guild: discord.Guild) -> None:
+        async with self.bot.pool.acquire() as conn:
+            res = await conn.fetchone("SELECT ip, port FROM query WHERE guild_id = ?", (guild.id,))
+
+        ip, port = res
+        if ip is None or port is None:
+            self.unwatch_server(guild.id)
+            return
+
+        self.watch_server(guild.id, ip, int(port))
+
+    def watch_server(self, guild_id: int, ip: str, port: int) -> None:
+        """Adds the guild to the watchers of the server and starts sampling the server if it wasn't already."""
+        server = (ip, port)
+        if self.guild_servers.get(guild_id) == server:
+            return
+
+        self.unwatch_server(guild_id)
+        self.guild_servers[guild_id] = server
+        self.stats_watchers.setdefault(server, set()).add(guild_id)
+
+        try:
+            if self.update_stats_tasks[server].is_running():
+                return
+        except KeyError:
+            pass
+
+        # One task per server no matter how many guilds watch it, so it's queried and recorded once per sample
+        @tasks.loop(seconds=60.0, reconnect=True)
+        async def update_stats(ip, port):
+            server = (ip, port)
+            self.mark_job_started(("stats", server))
+            with self.perf.job("stats", None, ip, port):
                 is_server_active: bool = False
                 data: Dict[str, Union[str, int, ServerInfo]] = {}
 
                 try:
-                    data["info"] = await self.query.get_server_info(ip, port, retry=False)
+                    with phase("query"):
+                        data["info"] = await self.query.get_server_info(ip, port, retry=False)
                     is_server_active = True
                 except Exception as exc:
                     if not isinstance(exc, ServerOffline):
@@ -107,126 +163,137 @@ class Status:
                 data["ip"] = ip
                 data["port"] = port
 
+                self.record_recent_activity(server, data["info"].players if is_server_active else 0, is_server_active) # type: ignore
+
                 if is_server_active:
                     await self.update_server_stats(data) 
 
-                try:
-                    self.last_dailystats_update[guild_id]
-                except KeyError:
-                    await self.update_daily_server_stats(data, is_server_active, guild_id)
-                else:
-                    difference = datetime.now() - self.last_dailystats_update[guild_id]
-                    minutes = divmod(difference.total_seconds(), 60)[0]
-                    if minutes >= (DAILY_STATS_INTERVAL - 1):
-                        await self.update_daily_server_stats(data, is_server_active, guild_id)
+                if self.last_dailystats_update.get(server) != get_sample_bucket(): # First query in this bucket
+                    await self.update_daily_server_stats(data, is_server_active)
 
+                self.reschedule_stats_update(server, data["info"].players if is_server_active else None) # type: ignore
                 self.bot.logger.info(f"Finished updating statistics of {ip}:{port}.")
 
-            self.update_stats_tasks[guild_id] = update_stats
-            self.update_stats_tasks[guild_id].start(guild_id, ip, port)
+        self.update_stats_tasks[server] = update_stats
+        self.update_stats_tasks[server].start(ip, port)
 
-    async def start_stats_update_with_guild(self, guild: discord.Guild) -> None:
-        async with self.bot.pool.acquire() as conn:
-            res = await conn.fetchone("SELECT ip, port FROM query WHERE guild_id = ?", (guild.id,))
+    def unwatch_server(self, guild_id: int) -> None:
+        """Removes the guild from the watchers of its server and stops sampling the server once nobody watches it."""
+        try:
+            server = self.guild_servers.pop(guild_id)
+        except KeyError:
+            return
 
-        @tasks.loop(seconds=60.0, reconnect=True)
-        async def update_stats(guild_id, ip, port):
-            is_server_active: bool = False
-            data: Dict[str, Union[str, int, ServerInfo]] = {}
+        watchers = self.stats_watchers.get(server, set())
+        watchers.discard(guild_id)
+        if watchers:
+            return
 
-            try:
-                data["info"] = await self.query.get_server_info(ip, port, retry=False)
-                is_server_active = True
-            except Exception as exc:
-                if not isinstance(exc, ServerOffline):
-                    traceback.print_exc()
+        self.stats_watchers.pop(server, None)
+        self.cadence.forget(("stats", server))
+        self.recent.forget(server)
+        self.next_due.pop(("stats", server), None)
+        try:
+            task = self.update_stats_tasks.pop(server)
+        except KeyError:
+            return
+        if task.is_running():
+            task.cancel()
 
-            data["ip"] = ip
-            data["port"] = port
+    def record_recent_activity(self, server: Server, players: int, online: bool) -> None:
+        now = int(time.time())
+        self.recent.record(server, now, players, online)
 
-            if is_server_active:
-                await self.update_server_stats(data) 
+        if self.bot.series is not None: # The store gets the minutes downsampled once their bucket is complete
+            samples = self.recent.take_flush(server, now, config.RECENT_FLUSH_RESOLUTION)
+            if samples:
+                self.bot.series.append(server[0], server[1], samples)
 
-            try:
-                self.last_dailystats_update[guild_id]
-            except KeyError:
-                await self.update_daily_server_stats(data, is_server_active, guild_id)
-            else:
-                difference = datetime.now() - self.last_dailystats_update[guild_id]
-                minutes = divmod(difference.total_seconds(), 60)[0]
-                if minutes >= (DAILY_STATS_INTERVAL - 1):
-                    await self.update_daily_server_stats(data, is_server_active, guild_id)
-
-            self.bot.logger.info(f"Finished updating statistics of {ip}:{port}.")
+    def mark_job_started(self, key: Tuple[str, Hashable]) -> None:
+        job = key[0]
+        JOBS_RUN.inc(job)
 
         try:
-            if self.update_stats_tasks[guild.id].is_running():
-                self.update_stats_tasks[guild.id].cancel()
-        except KeyError:
-            pass
-
-        ip, port = res
-
-        self.update_stats_tasks[guild.id] = update_stats
-        self.update_stats_tasks[guild.id].start(guild.id, ip, port)
+            due = self.next_due.pop(key)
+        except KeyError: # First iteration, it was due right away
+            JOBS_DUE.inc(job)
+        else:
+            SCHEDULER_LAG.observe(max(0.0, time.time() - due), job)
+
+    def schedule_job(self, key: Tuple[str, Hashable], loop: tasks.Loop) -> None:
+        # The loop schedules its next run from the start of the current one rather than its end,
+        # so the time an iteration takes counts as lag too
+        next_iteration = loop.next_iteration
+        if next_iteration is not None:
+            self.next_due[key] = next_iteration.timestamp()
+            JOBS_DUE.inc(key[0])
+
+    def reschedule_stats_update(self, server: Server, players: Optional[int]) -> None:
+        key = ("stats", server)
+        self.cadence.observe(key, players)
+        seconds = self.cadence.interval(key, config.STATS_MIN_INTERVAL, config.STATS_MAX_INTERVAL)
+        try:
+            loop = self.update_stats_tasks[server]
+        except KeyError: # Nobody watches the server anymore
+            return
+        loop.change_interval(seconds=seconds)
+        self.schedule_job(key, loop)
+
+    def reschedule_status(self, guild_id: int, interval: float, players: Optional[int]) -> None:
+        key = ("status", guild_id)
+        self.cadence.observe(key, players)
+        upper = interval * 60 # The interval set by the guild is the slowest the status is refreshed
+        seconds = self.cadence.interval(key, min(config.STATUS_MIN_INTERVAL * 60, upper), upper)
+        loop = self.guild_status_tasks[guild_id]
+        loop.change_interval(seconds=seconds)
+        self.schedule_job(key, loop)
 
     async def update_server_stats(self, data: Dict[str, str | int | ServerInfo]) -> None:
-        async with self.bot.pool.acquire() as conn:
-            stats = await conn.fetchone("SELECT highest_playercount, peak_hour FROM stats WHERE ip = ? AND port = ?", (data["ip"], data["port"]))
-            
-            highest_playercount, peak_hour = stats[0], stats[1]
-            current_players = data["info"].players # type: ignore
-
-            query: str
-            params: tuple[int, str | None, Union[str, int]]
-
-            if not highest_playercount or current_players > highest_playercount:
-                peak_hour = _utils.get_peak_hour() if highest_playercount else None
-                query, params = "UPDATE stats SET highest_playercount = ?, peak_hour = ? WHERE ip = ? AND port = ?", (current_players, peak_hour, data["ip"], data["port"]) # type: ignore
-                await conn.execute(query, params)
-                await conn.commit()
-
-    async def update_daily_server_stats(self, data: Dict[str, Union[str, int, ServerInfo]], is_server_active: bool, guild_id: int) -> None:
+        current_players = data["info"].players # type: ignore
+
+        # The comparison with the recorded highest player count is done by the database so nothing has to be read first.
+        # The peak hour is only recorded once there was a previous highest player count to beat.
+        query = """
+            UPDATE stats SET
+                peak_hour = CASE WHEN highest_playercount THEN ? ELSE NULL END,
+                highest_playercount = ?
+            WHERE ip = ? AND port = ? AND (highest_playercount IS NULL OR highest_playercount = 0 OR highest_playercount < ?)
+        """
+        params = (_utils.get_peak_hour(), current_players, data["ip"], data["port"], current_players)
+
+        with phase("db"):
+            await self.bot.writer.submit(query, params)
+
+    async def update_daily_server_stats(self, data: Dict[str, Union[str, int, ServerInfo]], is_server_active: bool) -> None:
         ip, port = data["ip"], data["port"]
         if is_server_active:
             player_count = data["info"].players # type: ignore
-            status = "online"
         else:
             player_count = 0
-            status = "offline"
 
-        async with self.bot.pool.acquire() as conn:
-            res = await conn.fetchone("SELECT timezone FROM query WHERE guild_id = ?", (guild_id))
-
-            try:
-                now = datetime.now(pytz.timezone(res[0]))
-            except pytz.UnknownTimeZoneError:
-                now = datetime.now()
-
-            date = now.strftime("%Y-%m-%d")
-            time = now.strftime("%H:%M")
-
-            query = """
-                INSERT INTO dailystats (
-                    guild_id,
-                    ip,
-                    port,
-                    playercount,
-                    date,
-                    time,
-                    status
-                )
-                VALUES (
-                    ?, ?, ?, ?, ?, ?, ?
-                )
-            """
-            params = (guild_id, ip, port, player_count, date, time, status)
-            
-            await conn.execute(query, params)
-            await conn.commit()
-
-        self.bot.logger.warning(f"Updated daily stats in {guild_id}.")
-        self.last_dailystats_update[guild_id] = datetime.now()
+        # Samples are stored in UTC, the guild's timezone is applied when they're read.
+        # There's one per server and bucket, so a restart within a bucket can't record it twice.
+        bucket = get_sample_bucket()
+        query = """
+            INSERT INTO dailystats (
+                ip,
+                port,
+                timestamp,
+                playercount,
+                online
+            )
+            VALUES (
+                ?, ?, ?, ?, ?
+            )
+            ON CONFLICT (ip, port, timestamp) DO NOTHING
+        """
+        params = (ip, port, bucket, player_count, int(is_server_active))
+
+        with phase("db"):
+            await self.bot.writer.submit(query, params)
+
+        self.bot.logger.warning(f"Updated daily stats of {ip}:{port}.")
+        self.last_dailystats_update[(ip, port)] = bucket # type: ignore
 
     async def send_offline_status(self, interval: int, channel_id: int, guild_id: int) -> None:
         e = discord.Embed(
@@ -235,7 +302,7 @@ class Status:
             timestamp=discord.utils.utcnow()
         )
 
-        e.set_footer(text=f"Auto-updates every {int(interval)} minutes | Last updated", icon_url="https://cdn.discordapp.com/emojis/1226063973644763147.gif?size=128&quality=lossless")
+        e.set_footer(text=f"Auto-updates at least every {int(interval)} minutes | Last updated", icon_url="https://cdn.discordapp.com/emojis/1226063973644763147.gif?size=128&quality=lossless")
 
         try:
             if self._resend_next_iter[guild_id]:
@@ -250,29 +317,36 @@ class Status:
         message = await self.get_status_message(guild_id, channel_id)
 
         if not message:
-            self.status_messages[guild_id] = await self.get_status_channel(guild_id, channel_id).send(embed=e)
+            with DISCORD_LATENCY.time("send"), phase("discord"):
+                self.status_messages[guild_id] = await self.get_status_channel(guild_id, channel_id).send(embed=e)
 
             async with self.bot.pool.acquire() as conn:
-                await conn.execute("UPDATE query SET message_id = ? WHERE guild_id = ?", (self.status_messages[guild_id].id, guild_id,))
-                await conn.commit()
+                with DB_LATENCY.time("update_message_id"), phase("db"):
+                    await conn.execute("UPDATE query SET message_id = ? WHERE guild_id = ?", (self.status_messages[guild_id].id, guild_id,))
+                    await conn.commit()
 
         elif isinstance(message, discord.Message):
-            self.status_messages[guild_id] =  await message.edit(embed=e, view=None)
+            with DISCORD_LATENCY.time("edit"), phase("discord"):
+                self.status_messages[guild_id] =  await message.edit(embed=e, view=None)
         else:
             try:
-                self.status_messages[guild_id] =  await message.edit(embed=e, view=None)
+                with DISCORD_LATENCY.time("edit"), phase("discord"):
+                    self.status_messages[guild_id] =  await message.edit(embed=e, view=None)
             except (discord.HTTPException, discord.Forbidden, discord.NotFound): # Message doesn't exist
-                self.status_messages[guild_id] = await self.get_status_channel(guild_id, channel_id).send(embed=e)
+                with DISCORD_LATENCY.time("send"), phase("discord"):
+                    self.status_messages[guild_id] = await self.get_status_channel(guild_id, channel_id).send(embed=e)
 
                 async with self.bot.pool.acquire() as conn:
-                    await conn.execute("UPDATE query SET message_id = ? WHERE guild_id = ?", (self.status_messages[guild_id].id, guild_id,))
-                    await conn.commit()
+                    with DB_LATENCY.time("update_message_id"), phase("db"):
+                        await conn.execute("UPDATE query SET message_id = ? WHERE guild_id = ?", (self.status_messages[guild_id].id, guild_id,))
+                        await conn.commit()
 
     async def send_status(self, data: ServerData, interval: int, channel_id: int, guild_id: int) -> None:
         self.bot.server_data[guild_id] = data
 
-        e, view = _utils.make_svinfo_embed(data)
-        e.set_footer(text=f"Auto-updates every {int(interval)} minutes | Last updated", icon_url="https://cdn.discordapp.com/emojis/1226063973644763147.gif?size=128&quality=lossless")
+        with phase("embed"):
+            e, view = _utils.make_svinfo_embed(data)
+        e.set_footer(text=f"Auto-updates at least every {int(interval)} minutes | Last updated", icon_url="https://cdn.discordapp.com/emojis/1226063973644763147.gif?size=128&quality=lossless")
 
         try:
             if self._resend_next_iter[guild_id]:
@@ -286,23 +360,29 @@ class Status:
         message = await self.get_status_message(guild_id, channel_id)
 
         if not message:
-            self.status_messages[guild_id] = await self.get_status_channel(guild_id, channel_id).send(embed=e, view=view)
+            with DISCORD_LATENCY.time("send"), phase("discord"):
+                self.status_messages[guild_id] = await self.get_status_channel(guild_id, channel_id).send(embed=e, view=view)
 
             async with self.bot.pool.acquire() as conn:
-                await conn.execute("UPDATE query SET message_id = ? WHERE guild_id = ?", (self.status_messages[guild_id].id, guild_id,))
-                await conn.commit()
+                with DB_LATENCY.time("update_message_id"), phase("db"):
+                    await conn.execute("UPDATE query SET message_id = ? WHERE guild_id = ?", (self.status_messages[guild_id].id, guild_id,))
+                    await conn.commit()
 
         elif isinstance(message, discord.Message):
-            self.status_messages[guild_id] = await message.edit(embed=e, view=view)
+            with DISCORD_LATENCY.time("edit"), phase("discord"):
+                self.status_messages[guild_id] = await message.edit(embed=e, view=view)
         else:
             try:
-                self.status_messages[guild_id] = await message.edit(embed=e, view=view)
+                with DISCORD_LATENCY.time("edit"), phase("discord"):
+                    self.status_messages[guild_id] = await message.edit(embed=e, view=view)
             except (discord.HTTPException, discord.Forbidden, discord.NotFound): # Message doesn't exist
-                self.status_messages[guild_id] = await self.get_status_channel(guild_id, channel_id).send(embed=e, view=view)
+                with DISCORD_LATENCY.time("send"), phase("discord"):
+                    self.status_messages[guild_id] = await self.get_status_channel(guild_id, channel_id).send(embed=e, view=view)
 
                 async with self.bot.pool.acquire() as conn:
-                    await conn.execute("UPDATE query SET message_id = ? WHERE guild_id = ?", (self.status_messages[guild_id].id, guild_id,))
-                    await conn.commit()
+                    with DB_LATENCY.time("update_message_id"), phase("db"):
+                        await conn.execute("UPDATE query SET message_id = ? WHERE guild_id = ?", (self.status_messages[guild_id].id, guild_id,))
+                        await conn.commit()
 
     def retrieve_config_from_data(self, data: Row) -> tuple[int, str | None, int | None, float | None, int | None]:
         guild_id = data[0]
@@ -335,20 +415,27 @@ class Status:
 
         @tasks.loop(minutes=interval, reconnect=True)
         async def get_status(guild_id, ip, port, channel_id, interval):
-            try:
-                data = await self.query.get_server_data(ip, port)
-            except ServerOffline:
+            self.mark_job_started(("status", guild_id))
+            with self.perf.job("status", guild_id, ip, port):
+                players = None
                 try:
-                    await self.send_offline_status(interval, channel_id, guild_id)
-                except Exception:
-                    await self.bot.log_error_via_webhook("get_status", traceback.format_exc(), extra=f"in guild ID {guild_id}")
-            except Exception: # Any other exception
-                await self.bot.log_error_via_webhook("get_status", traceback.format_exc(), extra=f"in guild ID {guild_id}")
-            else:
-                try:
-                    await self.send_status(data, interval, channel_id, guild_id)
-                except Exception:
+                    with phase("query"):
+                        data = await self.query.get_server_data(ip, port)
+                except ServerOffline:
+                    try:
+                        await self.send_offline_status(interval, channel_id, guild_id)
+                    except Exception:
+                        await self.bot.log_error_via_webhook("get_status", traceback.format_exc(), extra=f"in guild ID {guild_id}")
+                except Exception: # Any other exception
                     await self.bot.log_error_via_webhook("get_status", traceback.format_exc(), extra=f"in guild ID {guild_id}")
+                else:
+                    players = data["info"].players
+                    try:
+                        await self.send_status(data, interval, channel_id, guild_id)
+                    except Exception:
+                        await self.bot.log_error_via_webhook("get_status", traceback.format_exc(), extra=f"in guild ID {guild_id}")
+
+                self.reschedule_status(guild_id, interval, players)
 
         try:
             if self.guild_status_tasks[guild_id] is not None:
@@ -390,20 +477,27 @@ class Status:
 
             @tasks.loop(minutes=interval, reconnect=True)
             async def get_status(guild_id, ip, port, channel_id, interval):
-                try:
-                    data = await self.query.get_server_data(ip, port)
-                except ServerOffline:
+                self.mark_job_started(("status", guild_id))
+                with self.perf.job("status", guild_id, ip, port):
+                    players = None
                     try:
-                        await self.send_offline_status(interval, channel_id, guild_id)
-                    except Exception:
-                        await self.bot.log_error_via_webhook("get_status", traceback.format_exc(), extra=f"in guild ID {guild_id}")
-                except Exception:
-                    await self.bot.log_error_via_webhook("get_status", traceback.format_exc(), extra=f"in guild ID {guild_id}")
-                else:
-                    try:
-                        await self.send_status(data, interval, channel_id, guild_id)
+                        with phase("query"):
+                            data = await self.query.get_server_data(ip, port)
+                    except ServerOffline:
+                        try:
+                            await self.send_offline_status(interval, channel_id, guild_id)
+                        except Exception:
+                            await self.bot.log_error_via_webhook("get_status", traceback.format_exc(), extra=f"in guild ID {guild_id}")
                     except Exception:
                         await self.bot.log_error_via_webhook("get_status", traceback.format_exc(), extra=f"in guild ID {guild_id}")
+                    else:
+                        players = data["info"].players
+                        try:
+                            await self.send_status(data, interval, channel_id, guild_id)
+                        except Exception:
+                            await self.bot.log_error_via_webhook("get_status", traceback.format_exc(), extra=f"in guild ID {guild_id}")
+
+                    self.reschedule_status(guild_id, interval, players)
 
             try:
                 if self.guild_status_tasks[guild_id] is not None:
@@ -1,11 +1,14 @@
 from __future__ import annotations
 
 import re
+import time
 import discord
+import pytz
 
 from typing import Literal
-from datetime import datetime
-from helpers import config, _types
+from datetime import date, datetime, timedelta, tzinfo
+from functools import lru_cache
+from helpers import config, _types, migrations
 
 from typing import List, Tuple, Optional, TYPE_CHECKING
 
@@ -13,11 +16,18 @@ if TYPE_CHECKING:
     from samp_query import RuleList
     from asqlite import ProxiedConnection
     from bot import QueryBot
-    from sqlite3 import Row
 
     from helpers import _types
     ServerData = _types.ServerData
 
+# (label, rollup table, bucket column, bucket size, window) of the uptime windows shown in the statistics, None is all time
+UPTIME_WINDOWS = [
+    ("24h", "rollup_hourly", "hour", 3600, 86400),
+    ("7d", "rollup_daily", "day", 86400, 7 * 86400),
+    ("30d", "rollup_daily", "day", 86400, 30 * 86400),
+    ("All time", "rollup_monthly", "month", 0, None),
+]
+
 MONTHS = ["January", "February", "March", "April", "May", "June", "July", "August", "September", "October", "November", "December"]
 
 def get_uptime_emoji(emoji: Literal['GREEN', 'ORANGE', 'RED']) -> str:
@@ -55,42 +65,9 @@ def is_ip(address: str) -> bool:
         len([octet for i, octet in enumerate(octets) if ((octet >= 0 if i != 0 else octet > 0) and octet <= 255)]) == 4
     ])
 
-async def set_up_database(conn: ProxiedConnection) -> None:
-    """Function to set up the database tables."""
-
-    sql_script = """
-        CREATE TABLE IF NOT EXISTS query (
-            guild_id INTEGER NOT NULL,
-            ip CHAR(45),
-            port SMALLINT,
-            interval SMALLINT,
-            channel_id INT,
-            logs INT,
-            message_id INT,
-            timezone CHAR(40),
-            PRIMARY KEY (guild_id)
-        );
-
-        CREATE TABLE IF NOT EXISTS stats (
-            ip CHAR(45),
-            port SMALLINT,
-            highest_playercount SMALLINT,
-            peak_hour CHAR(10),
-            PRIMARY KEY (ip, port)
-        );
-
-        CREATE TABLE IF NOT EXISTS dailystats (
-            guild_id INT,
-            ip CHAR(45),
-            port SMALLINT,
-            playercount SMALLINT,
-            date DATE,
-            time CHAR(6),
-            status CHAR(8)
-        );
-    """ 
-    await conn.executescript(sql_script)
-    await conn.commit()
+async def set_up_database(conn: ProxiedConnection) -> List[str]:
+    """Function to set up the database tables, returns the names of the migrations that were applied."""
+    return await migrations.migrate(conn)
 
 def command_mention_from_interaction(interaction: discord.Interaction[QueryBot]) -> str:
     id = interaction.data['id'] # type: ignore
@@ -169,7 +146,7 @@ class StatusView(discord.ui.View):
 
         async with interaction.client.pool.acquire() as conn:
             stats = await conn.fetchone("SELECT highest_playercount, peak_hour FROM stats WHERE ip = ? AND port = ?", (self.ip, self.port,))
-            uptime_data = await conn.fetchall("SELECT status FROM dailystats WHERE ip = ? AND port = ?", (self.ip, self.port,))
+            uptime_percentage = await fetch_uptime(conn, self.ip, self.port)
         
             highest_playerc = stats[0] 
             peak_hour = stats[1]
@@ -180,8 +157,6 @@ class StatusView(discord.ui.View):
                 await conn.execute(query, params)
                 await conn.commit()
 
-        uptime_percentage = calc_uptime(uptime_data)
-
         e.add_field(name="Highest Recorded Player Count", value=highest_playerc)
         e.add_field(name="Current Players Online", value=self.current_players)
         e.add_field(name="Recorded Peak Time", value=f"`{peak_hour}`", inline=False)
@@ -246,12 +221,7 @@ def make_svinfo_embed(data: ServerData, *, server_stats: bool = True) -> Tuple[d
         
     return e, status_view
 
-def calc_uptime(data: List[Row]) -> str:
-    total_status, total_uptime = len(data), 0
-    for row in data:
-        if row[0] == "online":
-            total_uptime += 1
-
+def calc_uptime(total_uptime: int, total_status: int) -> str:
     try:
         percentage = (total_uptime / total_status) * 100
     except ZeroDivisionError:
@@ -266,6 +236,77 @@ def calc_uptime(data: List[Row]) -> str:
         emoji = get_uptime_emoji('RED')
         return f"{emoji} {percentage:.2f}%"
 
+async def fetch_uptime(conn: ProxiedConnection, ip: str, port: int) -> str:
+    """Returns the uptime of the server in every window of UPTIME_WINDOWS, one per line.
+
+    Each window sums at most a few dozen rollup rows, so this doesn't get slower as the history grows.
+    """
+    now = int(time.time())
+    selects, params = [], []
+    for i, (_label, table, column, size, window) in enumerate(UPTIME_WINDOWS):
+        query = f"SELECT {i}, SUM(samples), SUM(online_samples) FROM {table} WHERE ip = ? AND port = ?"
+        params.extend((ip, port))
+        if window is not None:
+            since = now - window
+            query += f" AND {column} >= ?"
+            params.append(since - since % size) # Include the bucket the window starts in
+        selects.append(query)
+
+    res = await conn.fetchall(" UNION ALL ".join(selects), tuple(params))
+
+    lines = []
+    for i, samples, online_samples in sorted(res, key=lambda row: row[0]):
+        lines.append(f"**{UPTIME_WINDOWS[i][0]}**: {calc_uptime(online_samples or 0, samples or 0)}")
+    return "\n".join(lines)
+
+@lru_cache(maxsize=None)
+def get_timezone(name: Optional[str]) -> Optional[tzinfo]:
+    """Returns the timezone by its name, None means the bot's local time should be used."""
+    try:
+        return pytz.timezone(name)
+    except pytz.UnknownTimeZoneError:
+        return None
+
+def localize(naive: datetime, tz: Optional[tzinfo]) -> datetime:
+    if tz is None:
+        return naive.astimezone() # Bot's local time
+    return tz.localize(naive) # type: ignore # pytz timezones need localize to pick the right offset
+
+def to_local(timestamp: int, tz: Optional[tzinfo]) -> datetime:
+    return datetime.fromtimestamp(timestamp, tz)
+
+def month_bounds(year: int, month: int, tz: Optional[tzinfo]) -> Tuple[int, int]:
+    """Returns the UTC timestamps at which the month starts and ends in the timezone."""
+    start = localize(datetime(year, month, 1), tz)
+    end = localize(datetime(year + month // 12, month % 12 + 1, 1), tz)
+    return int(start.timestamp()), int(end.timestamp())
+
+def day_bounds(date: str, tz: Optional[tzinfo]) -> Tuple[int, int]:
+    """Returns the UTC timestamps at which the day (in the %Y-%m-%d format) starts and ends in the timezone."""
+    naive = datetime.strptime(date, "%Y-%m-%d")
+    start = localize(naive, tz)
+    end = localize(naive + timedelta(days=1), tz)
+    return int(start.timestamp()), int(end.timestamp())
+
+def range_bounds(start: date, end: date, tz: Optional[tzinfo]) -> Tuple[int, int]:
+    """Returns the UTC timestamps at which the first day starts and the last day ends in the timezone."""
+    first = localize(datetime.combine(start, datetime.min.time()), tz)
+    last = localize(datetime.combine(end + timedelta(days=1), datetime.min.time()), tz)
+    return int(first.timestamp()), int(last.timestamp())
+
+def period_dates(period: str, today: date) -> Tuple[date, date]:
+    """Returns the first and the last day of a chart period ending today, a week and 30 days roll while quarters and years are the calendar ones."""
+    if period == "week":
+        return today - timedelta(days=6), today
+    if period == "30d":
+        return today - timedelta(days=29), today
+    if period == "quarter":
+        return date(today.year, (today.month - 1) // 3 * 3 + 1, 1), today
+    if period == "year":
+        return date(today.year, 1, 1), today
+
+    raise ValueError(f"{period} is not a chart period.")
+
 def get_peak_hour() -> str:
     current_hour = datetime.now().hour
     indicator = "am" if current_hour < 12 else "pm"
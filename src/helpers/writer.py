@@ -0,0 +1,120 @@
+from __future__ import annotations
+
+import asyncio
+import asqlite
+import logging
+
+from itertools import groupby
+from typing import Any, List, Optional, Tuple
+from .metrics import DB_LATENCY, WRITER_BATCH
+
+Write = Tuple[str, Tuple[Any, ...]]
+
+class StatsWriter:
+    """Funnels the statistics writes through a single connection and commits them in batches.
+
+    A batch is committed once it holds batch_size writes or flush_interval seconds after its first write,
+    so the number of commits (and fsyncs) no longer grows with the number of guilds. A batch which fails
+    is tried again, and if it keeps failing its writes are committed one by one so only the failing ones are lost.
+    """
+    def __init__(self, database: str, *, batch_size: int, flush_interval: float, retries: int = 3, retry_delay: float = 0.5, logger: Optional[logging.Logger] = None) -> None:
+        self.database = database
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.logger = logger or logging.getLogger("discord")
+
+        self.queue: asyncio.Queue[Optional[Write]] = asyncio.Queue(maxsize=batch_size * 10) # Producers wait once the writer falls this far behind
+        self.conn: Optional[asqlite.Connection] = None
+        self.task: Optional[asyncio.Task] = None
+        self.lock = asyncio.Lock() # Held while a batch is committed, maintenance takes it to keep the writer out of its way
+
+    async def start(self) -> None:
+        self.conn = await asqlite.connect(self.database)
+        # Readers never wait for the writer in WAL mode, and NORMAL only syncs on checkpoints which is safe with WAL
+        await self.conn.execute("PRAGMA journal_mode = WAL")
+        await self.conn.execute("PRAGMA synchronous = NORMAL")
+        self.task = asyncio.create_task(self._run())
+
+    async def submit(self, statement: str, params: Tuple[Any, ...]) -> None:
+        await self.queue.put((statement, params))
+
+    async def close(self) -> None:
+        """Commits everything that was submitted and closes the connection."""
+        if self.task is not None:
+            await self.queue.put(None)
+            await self.task
+            self.task = None
+
+        if self.conn is not None:
+            await self.conn.close()
+            self.conn = None
+
+    async def _collect(self, first: Write) -> Tuple[List[Write], bool]:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.flush_interval
+        batch = [first]
+
+        while len(batch) < self.batch_size:
+            try:
+                item = self.queue.get_nowait()
+            except asyncio.QueueEmpty:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+
+            if item is None: # Closing, commit what we have
+                return batch, True
+            batch.append(item)
+
+        return batch, False
+
+    async def _run(self) -> None:
+        while True:
+            item = await self.queue.get()
+            if item is None:
+                return
+
+            batch, closing = await self._collect(item)
+            await self.flush(batch)
+
+            if closing:
+                return
+
+    async def flush(self, batch: List[Write]) -> None:
+        for attempt in range(self.retries):
+            try:
+                await self._commit(batch)
+            except Exception as exc: # Don't let one bad batch kill the writer
+                self.logger.warning(f"Committing a batch of {len(batch)} statistics writes failed (attempt {attempt + 1} of {self.retries}).", exc_info=exc)
+                if attempt + 1 < self.retries:
+                    await asyncio.sleep(self.retry_delay * (attempt + 1)) # A locked database is usually free again shortly
+            else:
+                WRITER_BATCH.observe(len(batch))
+                return
+
+        # A single bad write fails the whole batch, so the others are committed on their own
+        dropped = 0
+        for write in batch:
+            try:
+                await self._commit([write])
+            except Exception as exc:
+                dropped += 1
+                self.logger.error(f"Dropped a statistics write: {write[0]}", exc_info=exc)
+
+        WRITER_BATCH.observe(len(batch) - dropped)
+
+    async def _commit(self, batch: List[Write]) -> None:
+        assert self.conn
+
+        async with self.lock:
+            with DB_LATENCY.time("stats_batch"):
+                async with self.conn.transaction():
+                    # Consecutive writes of the same statement go through a single executemany
+                    for statement, writes in groupby(batch, key=lambda write: write[0]):
+                        await self.conn.executemany(statement, [params for _, params in writes])
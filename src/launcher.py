@@ -0,0 +1,115 @@
+# The bot, its owner commands and its lifecycle. Only main.py imports it, when it's run as the script:
+# the chart processes run main.py as well (as __mp_main__) and mustn't build a bot of their own.
+from bot import QueryBot
+
+import discord
+from discord.ext import commands
+
+import traceback
+import asyncio
+import os
+import io
+import trio_asyncio
+
+from dotenv import load_dotenv
+from helpers import config
+from helpers.perf import format_phases
+from typing import Optional
+
+bot = QueryBot()
+
+@bot.command() 
+@commands.is_owner()
+async def sync(ctx: commands.Context) -> None:
+    try: 
+        synced = await bot.tree.sync()
+        await ctx.send(f"Synced {len(synced)} commands.")
+    except Exception:
+        e = discord.Embed(
+            title = "Exception",
+            color = discord.Color.red(),
+            timestamp = discord.utils.utcnow()
+        )
+        e.description = f"```py\n{traceback.format_exc()}```"
+        await ctx.send(embed=e)
+
+@bot.command()
+@commands.is_owner()
+async def monitor(ctx: commands.Context, action: Optional[str] = None) -> None: # Pass 'clear' to reset the stalls after dumping them
+    stalls = bot.loop_monitor.dump()
+    max_lag = bot.loop_monitor.max_lag * 1000
+
+    if not stalls:
+        await ctx.send(f"No stalls longer than {config.SLOW_CALLBACK_THRESHOLD}s were caught. Worst lag: {max_lag:.0f}ms.")
+    else:
+        summary = "\n".join(f"{i}. {stall.duration * 1000:.0f}ms in {stall.coroutine} at {stall.timestamp:%H:%M:%S}" for i, stall in enumerate(stalls, start=1))
+        report = "\n\n".join(f"{stall.duration * 1000:.0f}ms in {stall.coroutine} at {stall.timestamp}\n{stall.stack}" for stall in stalls)
+        await ctx.send(f"Worst lag: {max_lag:.0f}ms.\n```\n{summary[:1900]}```", file=discord.File(io.BytesIO(report.encode()), filename="stalls.txt"))
+
+    if action == "clear":
+        bot.loop_monitor.clear()
+
+@bot.command()
+@commands.is_owner()
+async def perf(ctx: commands.Context, top: int = 5, action: Optional[str] = None) -> None: # Pass 'clear' after the count to reset the timings
+    timings = bot._status.perf
+    if not timings.slowest:
+        await ctx.send("No status or stats job has finished yet.")
+        return
+
+    lines = ["Slowest guilds (mean / worst):"]
+    lines.extend(f"{guild_id}: {stats.mean * 1000:.0f}ms / {stats.worst * 1000:.0f}ms over {stats.runs} runs, {format_phases(stats.phases)}" for guild_id, stats in timings.top_guilds(top))
+    lines.append("\nSlowest servers (mean / worst):")
+    lines.extend(f"{server}: {stats.mean * 1000:.0f}ms / {stats.worst * 1000:.0f}ms over {stats.runs} runs, {format_phases(stats.phases)}" for server, stats in timings.top_servers(top))
+    lines.append("\nSlowest jobs:")
+    lines.extend(f"{timer.job} in {timer.guild_id} ({timer.server}): {timer.total * 1000:.0f}ms, {format_phases(timer.phases)}" for timer in timings.slowest_jobs(top))
+
+    report = "\n".join(lines)
+    if len(report) > 1990:
+        await ctx.send(file=discord.File(io.BytesIO(report.encode()), filename="perf.txt"))
+    else:
+        await ctx.send(f"```\n{report}```")
+
+    if action == "clear":
+        timings.clear()
+
+load_dotenv()
+
+async def setup() -> None:
+    bot.setup_logger()
+    token = os.getenv('TOKEN')
+    if token:
+        async with bot:
+            await bot.start(token)
+    else:
+        raise RuntimeError("No login token was provided in the env file.")
+
+async def cleanup() -> None:
+    async with bot:
+        await bot.close()
+
+    bot.logger.info("Terminating all processes and stopping the loop...")
+    bot.loop_monitor.stop()
+    bot.maintenance.stop()
+    bot.prerenderer.stop()
+
+    # Check for running tasks before closing the pool
+    for guild_id in bot._status.guild_status_tasks:
+        if bot._status.guild_status_tasks[guild_id].is_running():
+            bot._status.guild_status_tasks[guild_id].cancel()
+
+    await asyncio.sleep(1)
+
+    await bot.writer.close() # Commit the statistics that are still queued
+    bot.chart.close()
+    if bot.metrics_server is not None:
+        await bot.metrics_server.close()
+
+    await bot.pool.close()
+    await bot._session.close()
+
+async def main() -> None:
+    try:
+        await trio_asyncio.aio_as_trio(setup)() # type: ignore # The module isn't typed properly
+    except KeyboardInterrupt:
+        await trio_asyncio.aio_as_trio(cleanup)() # type: ignore
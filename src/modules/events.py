@@ -286,6 +286,10 @@ class Events(commands.Cog):
             await conn.execute("DELETE FROM query WHERE guild_id = ?", (guild.id,))
             await conn.commit()
 
+        # Stop counting the guild's tasks against the query budget
+        self.bot._status.cadence.forget(("status", guild.id))
+        self.bot._status.unwatch_server(guild.id) # Stops sampling the server if no other guild watches it
+
         del self.bot._status.status_messages[guild.id]
 
         try:
@@ -295,12 +299,6 @@ class Events(commands.Cog):
         except KeyError:
             pass
 
-        try:
-            if self.bot._status.update_stats_tasks[guild.id].is_running():
-                self.bot._status.guild_status_tasks[guild.id].cancel()
-        except KeyError:
-            pass
-
     @commands.Cog.listener()
     async def on_message(self, message: discord.Message) -> None:
         if not message.guild:
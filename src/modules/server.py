@@ -5,17 +5,18 @@ from discord.ext import commands
 from discord import app_commands
 
 import traceback
-import asyncio
 import pytz
 import random
 
 from helpers import (
     utils as _utils,
+    config,
     ServerOffline,
     Mode
 )
+from helpers.heatmap import WEEKDAYS
 from datetime import datetime
-from typing import Optional, Union, List, Dict, TYPE_CHECKING
+from typing import Awaitable, Callable, Optional, Union, List, TYPE_CHECKING
 from functools import partial
 from inspect import cleandoc
 
@@ -25,6 +26,8 @@ if TYPE_CHECKING:
     from helpers.chart import ChartData
     from asqlite import ProxiedConnection
 
+    DayLoader = Callable[[str], Awaitable[ChartData]] # Fetches the time points of a day (%Y-%m-%d)
+
 class Overwrite(discord.ui.View):
     def __init__(self, ip: str, port: int, data: Row, author: discord.Member) -> None:
         super().__init__(timeout=60.0)
@@ -112,13 +115,14 @@ class Overwrite(discord.ui.View):
         await interaction.response.send_message(content="Successfully cancelled the configuration.")
 
 class ChartSelect(discord.ui.Select):
-    def __init__(self, data: Dict[str, ChartData], *, disabled: bool = False) -> None:
-        self.data = data
+    def __init__(self, days: List[str], day_loader: DayLoader, *, disabled: bool = False) -> None:
+        self.days = days
+        self.day_loader = day_loader
         super().__init__(
             placeholder = "Select a date",
             options = [
                 discord.SelectOption(label = "-".join(k[5:].split("-")[::-1]), value = k, emoji = "🗓️", description = f"Chart for the day of {'-'.join(k.split('-')[::-1])}") 
-                for i, k in enumerate(data.keys()) if i <= 24 
+                for i, k in enumerate(days) if i <= 24 
             ] if not disabled else [discord.SelectOption(label="Nothing")],
             row = 0,
             min_values = 1,
@@ -129,15 +133,14 @@ class ChartSelect(discord.ui.Select):
     async def callback(self, interaction: discord.Interaction[QueryBot]) -> None:
         await interaction.response.edit_message(view=self.view)
         if interaction.guild:
-            loop = asyncio.get_event_loop()
-            func = partial(interaction.client.chart.make_chart_from_data, interaction.guild.id, self.values[0], self.data, Mode.MODE_DAY)
-            chart = await loop.run_in_executor(None, func)
+            day = await self.day_loader(self.values[0])
+            chart = await interaction.client.chart.make_chart_from_data(self.values[0], day, Mode.MODE_DAY)
 
             await interaction.followup.send(file=chart) # type: ignore
 
 class ChartModal(discord.ui.Modal):
-    def __init__(self, data: Dict[str, ChartData]) -> None:
-        self.data = data
+    def __init__(self, day_loader: DayLoader) -> None:
+        self.day_loader = day_loader
         super().__init__(
             title = "Server Chart Made",
             timeout = 60.0
@@ -161,10 +164,9 @@ class ChartModal(discord.ui.Modal):
         date = "-".join(self.input.value.split("-")[::-1])
         if interaction.guild:
             resp = await interaction.original_response()
-            loop = asyncio.get_event_loop()
-            func = partial(interaction.client.chart.make_chart_from_data, interaction.guild.id, date, self.data, Mode.MODE_DAY)
             try:
-                chart = await loop.run_in_executor(None, func)
+                day = await self.day_loader(date)
+                chart = await interaction.client.chart.make_chart_from_data(date, day, Mode.MODE_DAY)
             except:
                 e = discord.Embed(description=f"{_utils.get_result_emoji('failure')} Server chart for **{self.input.value}** was not found.", color=discord.Color.red())
                 await resp.edit(embed=e)
@@ -172,9 +174,10 @@ class ChartModal(discord.ui.Modal):
                 await resp.edit(embed=None, attachments=[chart])
 
 class ChartView(discord.ui.View):
-    def __init__(self, data: Dict[str, ChartData], month: str) -> None:
+    def __init__(self, data: ChartData, month: str, day_loader: DayLoader) -> None:
         super().__init__(timeout=180.0)
         self.data = data
+        self.day_loader = day_loader
         self.month = month
         self.message: Optional[discord.Message] = None
         if self.entire_chart.label:
@@ -191,15 +194,13 @@ class ChartView(discord.ui.View):
     @discord.ui.button(label="placeholder", style=discord.ButtonStyle.gray, row=1)
     async def entire_chart(self, interaction: discord.Interaction[QueryBot], button: discord.ui.Button) -> None:
         if interaction.guild:
-            loop = asyncio.get_event_loop()
-            func = partial(interaction.client.chart.make_chart_from_data, interaction.guild.id, self.month, self.data)
-            chart = await loop.run_in_executor(None, func)
+            chart = await interaction.client.chart.make_chart_from_data(self.month, self.data)
 
             await interaction.response.send_message(file=chart) # type: ignore
 
     @discord.ui.button(label="Enter Date", style=discord.ButtonStyle.gray, row=1)
     async def enter_date(self, interaction: discord.Interaction[QueryBot], button: discord.ui.Button) -> None:
-        await interaction.response.send_modal(ChartModal(self.data))
+        await interaction.response.send_modal(ChartModal(self.day_loader))
 
 class TimezoneOverwrite(discord.ui.View):
     def __init__(self, conn: ProxiedConnection, current_tz: str, new_tz: str) -> None:
@@ -221,15 +222,7 @@ class TimezoneOverwrite(discord.ui.View):
     async def confirm(self, interaction: discord.Interaction[QueryBot], button: discord.ui.Button) -> None:
         assert interaction.guild
 
-        try:
-            task = interaction.client._status.update_stats_tasks[interaction.guild.id]
-        except KeyError:
-            pass
-        else:
-            if task.is_running():
-                task.cancel()
-
-        await self.conn.execute("DELETE FROM dailystats WHERE guild_id = ?", (interaction.guild.id))
+        # The history is shared by every guild watching the server, it can't be erased for one of them
         await self.conn.execute("UPDATE query SET timezone = ? WHERE guild_id = ?", (self.new_tz, interaction.guild.id))
 
         e = discord.Embed(
@@ -502,7 +495,7 @@ class Server(commands.Cog):
 
         await interaction.response.defer()
         async with self.bot.pool.acquire() as conn:
-            res = await conn.fetchone("SELECT ip, port FROM query WHERE guild_id = ?", (interaction.guild.id,))
+            res = await conn.fetchone("SELECT ip, port, timezone FROM query WHERE guild_id = ?", (interaction.guild.id,))
 
         ip, port = res[0], res[1]
 
@@ -537,7 +530,7 @@ class Server(commands.Cog):
 
         async with self.bot.pool.acquire() as conn:
             stats = await conn.fetchone("SELECT highest_playercount, peak_hour FROM stats WHERE ip = ? AND port = ?", (ip, port,))
-            uptime_data = await conn.fetchall("SELECT status FROM dailystats WHERE ip = ? AND port = ?", (ip, port,))
+            uptime_percentage = await _utils.fetch_uptime(conn, ip, port)
         
             highest_playerc = stats[0] 
             peak_hour = stats[1]
@@ -548,14 +541,27 @@ class Server(commands.Cog):
                 await conn.execute(query, params)
                 await conn.commit()
 
-        uptime_percentage = _utils.calc_uptime(uptime_data)
-
         e.add_field(name="Highest Recorded Player Count", value=highest_playerc)
         e.add_field(name="Current Players Online", value=current_players)
-        e.add_field(name="Recorded Peak Time", value=f"`{peak_hour}`", inline=False)
+        # The busiest hour of the week on average, the hour the highest count was seen in until enough was recorded
+        activity_heatmap = await self.bot.heatmaps.get(ip, port, res[2], _utils.get_timezone(res[2]))
+        peak = activity_heatmap.peak()
+        if peak is not None:
+            weekday, hour, average = peak
+            e.add_field(name="Peak Time", value=f"`{WEEKDAYS[weekday]}s at {hour:02}:00` (average of {average:.0f} players)", inline=False)
+        else:
+            e.add_field(name="Recorded Peak Time", value=f"`{peak_hour}`", inline=False)
         e.add_field(name="Uptime Percentage", value=uptime_percentage, inline=True)
 
-        await interaction.followup.send(embed=e)        
+        # The hourly peaks of the last day as a small bar chart, drawn without Matplotlib
+        activity = await self.chart.fetch_hours(ip, port, _utils.get_timezone(res[2]), 24)
+        if len(activity):
+            sparkline = await self.chart.make_chart_from_data(f"{ip}:{port}", activity, Mode.MODE_BARS)
+            e.set_image(url=f"attachment://{sparkline.filename}")
+            e.set_footer(text="Highest player count of every hour in the last 24 hours")
+            await interaction.followup.send(embed=e, file=sparkline)
+        else:
+            await interaction.followup.send(embed=e)        
 
     @server.command(name="chart", description="Fetches the chart of the server activity based on the arguments passed.", extras={"month": ['January', 'March', 'November', 'August']})
     @app_commands.describe(month="The month from which the chart should be made. Leave it empty to get the data for this month. All month names are valid. E.g. January, March, November.")
@@ -565,9 +571,10 @@ class Server(commands.Cog):
         await interaction.response.defer()
 
         async with self.bot.pool.acquire() as conn:
-            res = await conn.fetchone("SELECT ip, port FROM query WHERE guild_id = ?", (interaction.guild.id))
+            res = await conn.fetchone("SELECT ip, port, timezone FROM query WHERE guild_id = ?", (interaction.guild.id))
 
             ip, port = res[0], res[1]
+            tz = _utils.get_timezone(res[2])
 
             if not ip and not port:
                 command_mention = await interaction.client.tree.find_mention_for("server set")
@@ -589,12 +596,9 @@ class Server(commands.Cog):
             else:
                 month_int = _utils.MONTHS.index(month) + 1
 
-            if month_int < 10:
-                month_int = f"0{month_int}"
-
-            res = await conn.fetchall(f"SELECT playercount, date, time FROM dailystats WHERE guild_id = ? AND ip = ? AND port = ? AND date LIKE '{year_int}-{month_int}%'", (interaction.guild.id, ip, port,))  
-
-            data = self.chart.chart_data_from_res(res) 
+            self.bot.prerenderer.requested(ip, port, res[2]) # The popular ones are kept rendered
+            # The month only needs the daily peaks, the time points of a day are loaded when its chart is asked for
+            data = await self.chart.fetch_month(ip, port, tz, year_int, month_int)
             if not data: # No entries
                 e = discord.Embed(
                     description = f"{_utils.get_result_emoji('failure')} Charts for {month} were not found. If the month hasn't passed, try again a bit later.",
@@ -603,11 +607,7 @@ class Server(commands.Cog):
                 await interaction.followup.send(embed=e)
                 return
                 
-            copy = data.copy() # Make a copy of this dict to use to get logged days
-
-            for day, chart_data in data.items():
-                if not self.chart.can_chart_be_made(chart_data, Mode.MODE_DAY):
-                    del copy[day] # Days from which charts cannot be made are removed
+            copy = data.labels[data.samples >= 6].tolist() # Days from which charts can be made, with at least 6 time points
 
             e = discord.Embed(
                 title = "Server Chart Maker",
@@ -625,7 +625,7 @@ class Server(commands.Cog):
                 If the days logged below is not present in the drop-down, click on the **'Enter Date'** button and enter the date in the same format as seen in the list.
             """)
             logged_days = self.chart.get_logged_days(copy)
-            if not self.bot.chart.can_chart_be_made(data, Mode.MODE_MONTH) and len(logged_days) == 0: 
+            if not self.bot.chart.can_chart_be_made(data) and len(logged_days) == 0: 
                 e = discord.Embed(
                     description = f"{_utils.get_result_emoji('failure')} Charts for {month} were not found. If the month hasn't passed, try again a bit later.",
                     color = discord.Color.red()
@@ -639,13 +639,14 @@ class Server(commands.Cog):
                 valid_days = f"No days in {month} has more than 6 timepoints recorded."
             e.add_field(name=f"Logged Days in {month}", value=valid_days)
 
-            chart_view = ChartView(data, month)
+            day_loader = partial(self.chart.fetch_day, ip, port, tz)
+            chart_view = ChartView(data, month, day_loader)
             if len(logged_days) > 0:
-                chart_view.add_item(ChartSelect(copy)) # Init select with the 'copy' instance of the actual data   
+                chart_view.add_item(ChartSelect(copy, day_loader)) # Init select with the 'copy' instance of the actual data   
             else:
-                chart_view.add_item(ChartSelect(copy, disabled=True))
+                chart_view.add_item(ChartSelect(copy, day_loader, disabled=True))
 
-            if not self.bot.chart.can_chart_be_made(data, Mode.MODE_MONTH):
+            if not self.bot.chart.can_chart_be_made(data):
                 chart_view.entire_chart.disabled = True
 
             await interaction.followup.send(embed=e, view=chart_view)
@@ -664,6 +665,133 @@ class Server(commands.Cog):
                 app_commands.Choice(name=month, value=month) for month in _utils.MONTHS[:index+1] if month.lower() in current.lower()
             ]
         
+    @server.command(name="range", description="Fetches the chart of the server activity over a week, 30 days, a quarter, a year or the dates given.")
+    @app_commands.describe(
+        period="The period the chart should cover, the quarter and the year are the current ones so far.",
+        start="The first day of a custom period, in the dd-mm-yyyy format.",
+        end="The last day of a custom period, in the dd-mm-yyyy format. Defaults to today."
+    )
+    @app_commands.choices(period=[
+        app_commands.Choice(name="Last week", value="week"),
+        app_commands.Choice(name="Last 30 days", value="30d"),
+        app_commands.Choice(name="This quarter", value="quarter"),
+        app_commands.Choice(name="This year", value="year"),
+        app_commands.Choice(name="Custom", value="custom"),
+    ])
+    async def server_range(self, interaction: discord.Interaction[QueryBot], period: str, start: Optional[str] = None, end: Optional[str] = None) -> None:
+        assert interaction.guild
+
+        await interaction.response.defer()
+
+        async with self.bot.pool.acquire() as conn:
+            res = await conn.fetchone("SELECT ip, port, timezone FROM query WHERE guild_id = ?", (interaction.guild.id,))
+
+        if not res[0] or not res[1]:
+            command_mention = await interaction.client.tree.find_mention_for("server set")
+            e = discord.Embed(
+                description = f"{_utils.get_result_emoji('failure')} You must configure a SA-MP server for this guild using the {command_mention} command before fetching charts.",
+                color = discord.Color.red()
+            )
+            await interaction.followup.send(embed=e)
+            return
+
+        tz = _utils.get_timezone(res[2])
+        today = datetime.now(tz).date()
+        try:
+            if period == "custom":
+                if start is None:
+                    raise ValueError
+                first = datetime.strptime(start, "%d-%m-%Y").date()
+                last = min(datetime.strptime(end, "%d-%m-%Y").date(), today) if end else today
+                if first > last:
+                    raise ValueError
+            else:
+                first, last = _utils.period_dates(period, today)
+        except (ValueError, OverflowError):
+            e = discord.Embed(
+                description = f"{_utils.get_result_emoji('failure')} A custom period needs a start date and an end date after it, both in the `dd-mm-yyyy` format.",
+                color = discord.Color.red()
+            )
+            await interaction.followup.send(embed=e)
+            return
+
+        header = f"{first:%d-%m-%Y} To {last:%d-%m-%Y}"
+        data = await self.chart.fetch_range(res[0], int(res[1]), tz, first, last)
+        if not self.chart.can_chart_be_made(data):
+            e = discord.Embed(
+                description = f"{_utils.get_result_emoji('failure')} Not enough activity was recorded from {first:%d-%m-%Y} to {last:%d-%m-%Y} to make a chart.",
+                color = discord.Color.red()
+            )
+            await interaction.followup.send(embed=e)
+            return
+
+        chart = await self.chart.make_chart_from_data(header, data, Mode.MODE_RANGE)
+
+        await interaction.followup.send(file=chart)
+
+    @server.command(name="heatmap", description="Fetches the average player count of the server by the hour of the week.")
+    async def server_heatmap(self, interaction: discord.Interaction[QueryBot]) -> None:
+        assert interaction.guild
+
+        await interaction.response.defer()
+
+        async with self.bot.pool.acquire() as conn:
+            res = await conn.fetchone("SELECT ip, port, timezone FROM query WHERE guild_id = ?", (interaction.guild.id,))
+
+        if not res[0] or not res[1]:
+            command_mention = await interaction.client.tree.find_mention_for("server set")
+            e = discord.Embed(
+                description = f"{_utils.get_result_emoji('failure')} You must configure a SA-MP server for this guild using the {command_mention} command before fetching charts.",
+                color = discord.Color.red()
+            )
+            await interaction.followup.send(embed=e)
+            return
+
+        activity_heatmap = await self.bot.heatmaps.get(res[0], int(res[1]), res[2], _utils.get_timezone(res[2]))
+        if activity_heatmap.peak() is None:
+            e = discord.Embed(
+                description = f"{_utils.get_result_emoji('failure')} No activity was recorded yet, try again in an hour or so.",
+                color = discord.Color.red()
+            )
+            await interaction.followup.send(embed=e)
+            return
+
+        chart = await self.chart.make_chart_from_data(res[2] or "Bot Time", activity_heatmap.chart_data(), Mode.MODE_HEATMAP)
+
+        await interaction.followup.send(file=chart)
+
+    @server.command(name="recent", description="Fetches the per-minute chart of the server activity in the last hours.")
+    @app_commands.describe(hours="The number of hours the chart should cover. Defaults to 6.")
+    async def server_recent(self, interaction: discord.Interaction[QueryBot], hours: app_commands.Range[int, 1, config.RECENT_HOURS] = 6) -> None:
+        assert interaction.guild
+
+        await interaction.response.defer()
+
+        async with self.bot.pool.acquire() as conn:
+            res = await conn.fetchone("SELECT ip, port, timezone FROM query WHERE guild_id = ?", (interaction.guild.id,))
+
+        if not res[0] or not res[1]:
+            command_mention = await interaction.client.tree.find_mention_for("server set")
+            e = discord.Embed(
+                description = f"{_utils.get_result_emoji('failure')} You must configure a SA-MP server for this guild using the {command_mention} command before fetching charts.",
+                color = discord.Color.red()
+            )
+            await interaction.followup.send(embed=e)
+            return
+
+        data = self.chart.recent_chart_data(res[0], int(res[1]), _utils.get_timezone(res[2]), hours)
+        if not self.chart.can_chart_be_made(data):
+            e = discord.Embed(
+                description = f"{_utils.get_result_emoji('failure')} Not enough activity was recorded in the last {hours} hours yet, try again a bit later.",
+                color = discord.Color.red()
+            )
+            await interaction.followup.send(embed=e)
+            return
+
+        chart = await self.chart.make_chart_from_data(f"Last {hours} Hours", data, Mode.MODE_RECENT)
+
+        await interaction.followup.send(file=chart)
+
     @app_commands.command(name="status", description="Gets the status of any SA-MP/OMP game server.", extras={"Cog": "Server", "ip": ['144.76.57.59:9863', '46.183.184.33:7778']})
     @app_commands.describe(ip="The IP address of the server.")
     async def status(self, interaction: discord.Interaction[QueryBot], ip: str) -> None:
@@ -749,7 +877,7 @@ class Server(commands.Cog):
             if res[2]:
                 view = TimezoneOverwrite(conn, res[2], timezone)
                 e = discord.Embed(
-                    description = f"Are you sure you want to change the configured timezone for this server from **{res[2]}** to **{timezone}**.\n\n:warning: This will cause all chart data collected to be erased.",
+                    description = f"Are you sure you want to change the configured timezone for this server from **{res[2]}** to **{timezone}**.\n\n:information_source: The data collected so far is kept, the charts will show it in the new timezone.",
                     color = discord.Color.red()
                 )
                 await interaction.response.send_message(embed=e, view=view)